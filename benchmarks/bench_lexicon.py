@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# The shared lexicon lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexicon import TermMatcher, departments, titles
+
+# Plain speaker names the benchmark decorates with titles and departments
+BASE_NAMES = [
+    "ראובן ריבלין", "א' בורג", "אבי בורג", "דן מרידור", "יוסי שריד", "ש' וייס", "בני בגין",
+    "ציפי לבני", "מרדכי כהן", "שלמה בן עמי", "רחל אדטו", "יצחק לוי",
+]
+
+def load_names(path, limit):
+    """
+    Reads up to `limit` speaker names from a JSONL corpus.
+    """
+    names = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "speaker_name" in record:
+                names.append(record["speaker_name"])
+                if len(names) >= limit:
+                    break
+    return names
+
+def synthetic_names(count, seed):
+    """
+    Builds `count` speaker names with zero to two titles/departments around a base name.
+    """
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        parts = [rng.choice(titles[1:]) for _ in range(rng.randint(0, 2))]
+        if rng.random() < 0.5:
+            parts.append(rng.choice(departments))
+        parts.append(rng.choice(BASE_NAMES))
+        names.append(" ".join(parts))
+    return names
+
+def time_names_per_second(function, names, repeat):
+    """
+    Returns the best throughput (names/sec) of `function` over `repeat` runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in names:
+            function(name)
+        best = min(best, time.perf_counter() - start)
+    return len(names) / best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the old title regex against the shared longest-first lexicon matcher.")
+    parser.add_argument("--corpus", help="JSONL file to take speaker names from (default: synthetic names)")
+    parser.add_argument("--names", type=int, default=100_000, help="number of names to normalize")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per matcher, the best one is reported")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    names = load_names(args.corpus, args.names) if args.corpus else synthetic_names(args.names, args.seed)
+
+    # The alternation regex the scripts used before the shared lexicon
+    start = time.perf_counter()
+    regex = re.compile(rf"({'|'.join(map(re.escape, titles + departments))})", re.IGNORECASE)
+    regex_build = time.perf_counter() - start
+    start = time.perf_counter()
+    matcher = TermMatcher(titles + departments)
+    matcher_build = time.perf_counter() - start
+
+    results = {
+        "names": len(names),
+        "regex": {
+            "build_seconds": regex_build,
+            "strip_names_per_sec": time_names_per_second(lambda name: regex.sub("", name), names, args.repeat),
+            "findall_names_per_sec": time_names_per_second(regex.findall, names, args.repeat),
+        },
+        "matcher": {
+            "build_seconds": matcher_build,
+            "strip_names_per_sec": time_names_per_second(matcher.strip, names, args.repeat),
+            "findall_names_per_sec": time_names_per_second(matcher.findall, names, args.repeat),
+        },
+        # Names where longest-match semantics strip something different than the regex
+        "differing_names": sum(regex.sub("", name) != matcher.strip(name) for name in names),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
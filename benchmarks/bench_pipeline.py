@@ -0,0 +1,233 @@
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# The scripts under test live in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "idan"))
+
+from benchmarks.generate_corpus import generate_corpus
+from metrics import peak_rss_mb
+
+def speaker_names(path):
+    from field_scanner import read_numbered_byte_lines
+
+    names = []
+    for line_number, line in read_numbered_byte_lines(path):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "speaker_name" in record:
+            names.append(record["speaker_name"])
+    return names
+
+# Every stage is set up outside the timer and returns the timed callable and the number of
+# units (lines or names) it processes. The three scripts share the reader and the parser.
+def setup_read(path):
+    from field_scanner import read_numbered_byte_lines
+
+    def run():
+        for line_number, line in read_numbered_byte_lines(path):
+            pass
+    return run, sum(1 for _ in read_numbered_byte_lines(path))
+
+def setup_parse(path):
+    from field_scanner import read_numbered_byte_lines
+
+    lines = [line for line_number, line in read_numbered_byte_lines(path)]
+
+    def run():
+        for line in lines:
+            try:
+                json.loads(line)
+            except json.JSONDecodeError:
+                pass
+    return run, len(lines)
+
+def setup_normalize_top(path):
+    import print_top_5_common_speakers as top
+
+    names = speaker_names(path)
+    return lambda: [top.normalize_full_name(name) for name in names], len(names)
+
+def setup_normalize_surname(path):
+    import res_fixer
+
+    names = speaker_names(path)
+    return lambda: [res_fixer.normalize_full_name(name) for name in names], len(names)
+
+def setup_normalize_forbidden(path):
+    from lexicon import title_matcher
+
+    names = speaker_names(path)
+    return lambda: [title_matcher.findall(name, whole_words=True) for name in names], len(names)
+
+def setup_count_top(path):
+    import print_top_5_common_speakers as top
+    from name_cache import NormalizationCache
+
+    def run():
+        # A fresh cache per run, so every run resolves the names from scratch
+        top.cached_normalize_full_name = NormalizationCache(top.normalize_full_name, "benchmark")
+        top.run_first_pass(path)
+    return run, setup_read(path)[1]
+
+def setup_count_surname(path):
+    import res_fixer
+    from field_scanner import read_numbered_byte_lines
+    from name_cache import NormalizationCache
+
+    def run():
+        res_fixer.cached_normalize_full_name = NormalizationCache(res_fixer.normalize_full_name, "benchmark")
+        res_fixer.find_surname_variations(read_numbered_byte_lines(path))
+    return run, setup_read(path)[1]
+
+def setup_count_forbidden(path):
+    import exper
+    from field_scanner import read_numbered_byte_lines
+
+    return lambda: exper.find_forbidden_names(read_numbered_byte_lines(path)), setup_read(path)[1]
+
+def top_2_speakers(path):
+    import print_top_5_common_speakers as top
+    from heavy_hitters import top_k
+
+    counts, errors = top.run_first_pass(path)
+    return [name for name, count in top_k(counts, 2)]
+
+def setup_collect_top(path):
+    import print_top_5_common_speakers as top
+    from parallel_scan import read_numbered_lines
+
+    speakers = top_2_speakers(path)
+    return lambda: top.collect_sentences(read_numbered_lines(path), speakers), setup_read(path)[1]
+
+def setup_downsample_top(path):
+    import print_top_5_common_speakers as top
+    from parallel_scan import read_numbered_lines
+
+    speakers = top_2_speakers(path)
+    top_2_sentences, others, errors = top.collect_sentences(read_numbered_lines(path), speakers)
+    lists = [top_2_sentences[speaker] for speaker in speakers] + [others]
+    target = min(len(sentences) for sentences in lists)
+
+    def run():
+        for sentences in lists:
+            top.downsample_sentences_random(sentences, target)
+    return run, sum(len(sentences) for sentences in lists)
+
+def setup_cluster(path):
+    import speaker_clusters
+    from collections import Counter
+
+    name_counts = speaker_clusters.cleaned_name_counts(Counter(speaker_names(path)))
+    return lambda: speaker_clusters.cluster_names(name_counts.items()), len(name_counts)
+
+def setup_features(path):
+    import ngram_features
+
+    # Stages run in a process of their own, the store goes when it exits
+    store_dir = tempfile.mkdtemp(prefix="bench_features_")
+    atexit.register(shutil.rmtree, store_dir, True)
+    return lambda: ngram_features.build_features(path, store_dir), setup_read(path)[1]
+
+# (script, stage, setup, whether the stage reads the corpus file)
+STAGES = [
+    ("all", "read", setup_read, True),
+    ("all", "parse", setup_parse, False),
+    ("top_speakers", "normalize", setup_normalize_top, False),
+    ("top_speakers", "count", setup_count_top, True),
+    ("top_speakers", "collect", setup_collect_top, True),
+    ("top_speakers", "downsample", setup_downsample_top, False),
+    ("surname", "normalize", setup_normalize_surname, False),
+    ("surname", "count", setup_count_surname, True),
+    ("forbidden", "normalize", setup_normalize_forbidden, False),
+    ("forbidden", "count", setup_count_forbidden, True),
+    ("speakers", "cluster", setup_cluster, False),
+    ("features", "build", setup_features, True),
+]
+
+def run_stage(stage_index, path, repeat):
+    """
+    Runs one stage in the current (fresh) process and returns its best time and peak RSS.
+    """
+    script, stage, setup, reads_file = STAGES[stage_index]
+    run, units = setup(path)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    result = {
+        "script": script,
+        "stage": stage,
+        "seconds": best,
+        "units": units,
+        "units_per_sec": units / best if best else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if reads_file:
+        result["mb_per_sec"] = os.path.getsize(path) / (1024 * 1024) / best if best else None
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every stage of the three scripts on a JSONL corpus.")
+    parser.add_argument("--corpus", help="JSONL file to benchmark (default: generate a synthetic one)")
+    parser.add_argument("--lines", type=int, default=100_000, help="size of the generated corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best one is reported")
+    parser.add_argument("--stages", nargs="+", metavar="SCRIPT.STAGE",
+                        help="only run these stages, e.g. top_speakers.count all.read")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    selected = [
+        index for index, (script, stage, setup, reads_file) in enumerate(STAGES)
+        if not args.stages or f"{script}.{stage}" in args.stages
+    ]
+    if not selected:
+        parser.error("no stage matches --stages")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = args.corpus
+        corpus = {"path": path}
+        if path is None:
+            path = os.path.join(temp_dir, "result.jsonl")
+            start = time.perf_counter()
+            malformed = generate_corpus(path, args.lines, args.seed)
+            corpus = {"generated": True, "lines": args.lines, "seed": args.seed, "malformed": malformed,
+                      "generate_seconds": time.perf_counter() - start}
+        corpus["bytes"] = os.path.getsize(path)
+
+        # Each stage runs in its own process, so its peak RSS is not inflated by earlier stages
+        results = []
+        context = multiprocessing.get_context("spawn")
+        for index in selected:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(run_stage, index, path, args.repeat).result())
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "corpus": corpus,
+        "stages": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+# The scripts under test live in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.generate_corpus import generate_corpus
+from metrics import peak_rss_mb
+
+# Containers compared: what the sentence lists of print_top_5_common_speakers.py used to
+# be and the arena they are now
+CONTAINERS = ["list", "arena"]
+
+def load_sentences(path, container):
+    """
+    Collects the sentence_text of every line of a corpus into a new container, as the
+    second pass does for the top 2 and 'other' sentences together.
+    """
+    from parallel_scan import read_numbered_lines
+    from sentence_arena import SentenceArena
+
+    sentences = [] if container == "list" else SentenceArena()
+    for line_number, line in read_numbered_lines(path):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "sentence_text" in record:
+            sentences.append(record["sentence_text"])
+    return sentences
+
+def run_container(container, path, repeat):
+    """
+    Measures one container in the current (fresh) process: the memory held after
+    collecting every sentence, and the best times to collect, downsample to half and
+    read back every sentence.
+    """
+    import print_top_5_common_speakers as top
+
+    # Memory first, on its own run: tracemalloc slows down allocations
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sentences = load_sentences(path, container)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    utf8_bytes = sum(len(sentence.encode("utf-8")) for sentence in sentences)
+
+    timings = {"collect": float("inf"), "downsample": float("inf"), "iterate": float("inf")}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sentences = load_sentences(path, container)
+        timings["collect"] = min(timings["collect"], time.perf_counter() - start)
+
+        random.seed(0)
+        start = time.perf_counter()
+        top.downsample_sentences_random(sentences, len(sentences) // 2)
+        timings["downsample"] = min(timings["downsample"], time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for sentence in sentences:
+            pass
+        timings["iterate"] = min(timings["iterate"], time.perf_counter() - start)
+
+    return {
+        "container": container,
+        "sentences": len(sentences),
+        "utf8_bytes": utf8_bytes,
+        "held_bytes": held - baseline,
+        "bytes_per_sentence": (held - baseline) / len(sentences) if sentences else None,
+        "traced_peak_bytes": peak - baseline,
+        "seconds": timings,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the memory and speed of lists of str with SentenceArena for the collected sentences."
+    )
+    parser.add_argument("--corpus", help="JSONL file to collect sentences from (default: generate a synthetic one)")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="size of the generated corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per container, the best one is reported")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = args.corpus
+        corpus = {"path": path}
+        if path is None:
+            path = os.path.join(temp_dir, "result.jsonl")
+            generate_corpus(path, args.lines, args.seed)
+            corpus = {"generated": True, "lines": args.lines, "seed": args.seed}
+        corpus["bytes"] = os.path.getsize(path)
+
+        # Each container is measured in its own process, so neither sees the other's memory
+        results = []
+        context = multiprocessing.get_context("spawn")
+        for container in CONTAINERS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(run_container, container, path, args.repeat).result())
+
+    list_bytes, arena_bytes = (result["held_bytes"] for result in results)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": corpus,
+        "containers": results,
+        "arena_to_list_memory": arena_bytes / list_bytes if list_bytes else None,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
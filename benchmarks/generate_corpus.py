@@ -0,0 +1,157 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+
+# The shared lexicon and the name maps live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexicon import departments, titles
+from print_top_5_common_speakers import nickname_map, speaker_map
+
+# Building blocks of the synthetic speakers (nickname_map adds the short first names)
+FIRST_NAMES = [
+    "ראובן", "אברהם", "דן", "יוסף", "שמואל", "בנימין", "ציפורה", "מרדכי", "שלמה", "רחל", "יצחק",
+    "משה", "דוד", "אליהו", "רבקה", "מרים", "חנה", "אסתר", "יהושע", "עמיר", "לימור", "שלי", "גדעון",
+]
+LAST_NAMES = [
+    "ריבלין", "בורג", "מרידור", "שריד", "וייס", "בגין", "לבני", "כהן", "בן עמי", "אדטו", "לוי",
+    "פרץ", "ביילין", "יחימוביץ'", "סער", "אורבך", "גפני", "טיבי", "זנדברג", "שטייניץ",
+]
+SENTENCE_WORDS = [
+    "הכנסת", "החוק", "הצעת", "אני", "מבקש", "להגיד", "חברי", "הממשלה", "הוועדה", "היום", "לא", "כן",
+    "אדוני", "היושב", "ראש", "תודה", "רבה", "על", "זה", "את", "של", "הדיון", "בנושא", "התקציב",
+]
+PROTOCOL_TYPES = ["plenary", "committee"]
+HEBREW_LETTERS = "אבגדהוזחטיכלמנסעפצקרשת"
+
+class SpeakerPool:
+    """
+    A fixed population of speakers with Zipf-like weights, so a few speakers dominate
+    the corpus as in the real transcripts. Every speaker has a canonical first and last
+    name that the generator writes in different variations.
+    """
+
+    def __init__(self, rng, size, ocr_noise_rate=0.0):
+        nicknames = {}
+        for nickname, full_name in nickname_map.items():
+            if nickname != full_name:
+                nicknames.setdefault(full_name, []).append(nickname)
+        self.nicknames = nicknames
+        self.speakers = [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) for _ in range(size)]
+        self.cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+        self.mapped_names = list(speaker_map)
+        self.ocr_noise_rate = ocr_noise_rate
+
+    def name(self, rng):
+        """
+        Returns a raw speaker_name: a full name, an initial ("א' בורג") or a nickname,
+        sometimes taken from speaker_map, decorated with titles and departments.
+        """
+        if rng.random() < 0.05:
+            base = rng.choice(self.mapped_names)
+        else:
+            first, last = rng.choices(self.speakers, cum_weights=self.cum_weights)[0]
+            style = rng.random()
+            if style < 0.15:
+                first = first[0] + "'"
+            elif style < 0.3 and first in self.nicknames:
+                first = rng.choice(self.nicknames[first])
+            base = f"{first} {last}"
+        if self.ocr_noise_rate and rng.random() < self.ocr_noise_rate:
+            base = ocr_noise(rng, base)
+
+        roll = rng.random()
+        if roll < 0.4:
+            return base
+        if roll < 0.7:
+            return f"{rng.choice(titles[1:])} {base}"
+        if roll < 0.9:
+            return f"{rng.choice(['השר', 'שר', 'השרה', 'סגן שר', 'מזכירת'])} {rng.choice(departments)} {base}"
+        return f"{rng.choice(titles[1:])} {base} ({rng.choice(departments)})"
+
+def ocr_noise(rng, name):
+    """
+    The name with one letter substituted, dropped or doubled, as scanned transcripts
+    misspell names; such variants make up most of the distinct names in noisy corpora.
+    """
+    positions = [index for index, char in enumerate(name) if char in HEBREW_LETTERS]
+    if not positions:
+        return name
+    index = rng.choice(positions)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:index] + rng.choice(HEBREW_LETTERS) + name[index + 1:]
+    if kind == 1:
+        return name[:index] + name[index + 1:]
+    return name[:index] + name[index] + name[index:]
+
+def sentence(rng, line_number):
+    """
+    A random sentence ending in the line number, so every sentence is distinct.
+    """
+    return " ".join(rng.choices(SENTENCE_WORDS, k=rng.randint(4, 40))) + f" {line_number}."
+
+def malformed_line(rng, record):
+    """
+    A line `json.loads` rejects, in one of the ways seen in exported transcripts.
+    """
+    text = json.dumps(record, ensure_ascii=False)
+    kind = rng.randrange(3)
+    if kind == 0:
+        # Truncated line
+        return text[:rng.randint(1, len(text) - 1)]
+    if kind == 1:
+        # Raw control character inside a string
+        return text.replace('"speaker_name": "', '"speaker_name": "\x0c', 1)
+    # Missing comma between two fields
+    return text.replace(', "speaker_name"', ' "speaker_name"', 1)
+
+def generate_corpus(path, lines, seed=0, speakers=2000, malformed_rate=0.001, missing_sentence_rate=0.002,
+                    ocr_noise_rate=0.0):
+    """
+    Writes a reproducible synthetic corpus of `lines` JSONL records to `path`; the same
+    seed and sizes always produce the same bytes. Returns the number of malformed lines.
+    """
+    rng = random.Random(seed)
+    pool = SpeakerPool(rng, speakers, ocr_noise_rate)
+    malformed = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as file:
+        for line_number in range(1, lines + 1):
+            kneset_number = rng.randint(13, 25)
+            record = {
+                "protocol_name": f"{kneset_number}_ptm_{rng.randint(1, 600000)}.docx",
+                "kneset_number": kneset_number,
+                "protocol_type": rng.choice(PROTOCOL_TYPES),
+                "protocol_number": rng.randint(1, 400),
+                "speaker_name": pool.name(rng),
+                "sentence_text": sentence(rng, line_number),
+            }
+            if rng.random() < missing_sentence_rate:
+                del record["sentence_text"]
+            if rng.random() < malformed_rate:
+                file.write(malformed_line(rng, record) + "\n")
+                malformed += 1
+            else:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return malformed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic Knesset corpus.")
+    parser.add_argument("output", help="JSONL file to write")
+    parser.add_argument("--lines", type=int, default=100_000, help="number of lines (e.g. 100000, 1000000, 10000000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speakers", type=int, default=2000, help="number of distinct speakers")
+    parser.add_argument("--malformed-rate", type=float, default=0.001, help="share of lines that are not valid JSON")
+    parser.add_argument("--ocr-noise-rate", type=float, default=0.0,
+                        help="share of speaker names with a misspelled letter (adds many distinct names)")
+    args = parser.parse_args(argv)
+
+    malformed = generate_corpus(args.output, args.lines, args.seed, args.speakers, args.malformed_rate,
+                                ocr_noise_rate=args.ocr_noise_rate)
+    print(f"Wrote {args.lines} lines ({malformed} malformed) to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+
+# Bump when the layout of the checkpoint changes
+CHECKPOINT_VERSION = 2
+
+# Bytes read at a time when hashing or scanning the corpus
+READ_BLOCK = 1024 * 1024
+
+def checkpoint_path(corpus_path, analysis):
+    """
+    Default location of the checkpoint of an analysis over a corpus file.
+    """
+    return f"{corpus_path}.{analysis}.ckpt.json"
+
+def prefix_fingerprint(corpus_path, offset):
+    """
+    SHA-256 of the first `offset` bytes of the file, read in one sequential pass.
+    Appending to the file keeps it; changing any of those bytes changes it.
+    """
+    digest = hashlib.sha256(str(offset).encode("ascii"))
+    with open(corpus_path, "rb") as file:
+        remaining = offset
+        while remaining > 0:
+            block = file.read(min(remaining, READ_BLOCK))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+def complete_lines_end(corpus_path, start=0):
+    """
+    Offset right after the last newline of the file (or `start` if there is none after it).
+    A trailing line without a newline may still be growing, so it is never checkpointed.
+    """
+    size = os.path.getsize(corpus_path)
+    with open(corpus_path, "rb") as file:
+        position = size
+        while position > start:
+            block_start = max(start, position - READ_BLOCK)
+            file.seek(block_start)
+            block = file.read(position - block_start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                return block_start + newline + 1
+            position = block_start
+    return start
+
+def count_newlines(corpus_path, start, end):
+    """
+    Number of lines that end in the byte range [start, end).
+    """
+    count = 0
+    with open(corpus_path, "rb") as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = file.read(min(remaining, READ_BLOCK))
+            if not block:
+                break
+            count += block.count(b"\n")
+            remaining -= len(block)
+    return count
+
+def load_checkpoint(path, corpus_path, fingerprint):
+    """
+    Returns the saved checkpoint if it belongs to the same analysis and rules and the
+    corpus still starts with the bytes it covered; returns None otherwise, in which case
+    the corpus has to be scanned from the beginning.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            saved = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if saved.get("version") != CHECKPOINT_VERSION or saved.get("fingerprint") != fingerprint:
+        return None
+    if os.path.getsize(corpus_path) < saved["offset"]:
+        return None
+    if prefix_fingerprint(corpus_path, saved["offset"]) != saved["prefix"]:
+        return None
+    return saved
+
+def save_checkpoint(path, corpus_path, fingerprint, offset, lines, state):
+    """
+    Saves the state of an analysis after the first `offset` bytes (`lines` lines) of the corpus.
+    """
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "fingerprint": fingerprint,
+        "offset": offset,
+        "lines": lines,
+        "prefix": prefix_fingerprint(corpus_path, offset),
+        "state": state,
+    }
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def plan_resume(path, corpus_path, fingerprint):
+    """
+    Works out what an incremental run has to scan. Returns the saved checkpoint (or None
+    for a full rescan), the byte offset and line number to resume from, and the end of
+    the last complete line, up to which the new checkpoint will be saved.
+    """
+    saved = load_checkpoint(path, corpus_path, fingerprint)
+    start, lines = (saved["offset"], saved["lines"]) if saved else (0, 0)
+    return saved, start, lines, complete_lines_end(corpus_path, start)
@@ -0,0 +1,123 @@
+import bz2
+import gzip
+import json
+import lzma
+import os
+
+# Compressed corpora are recognized by their file name suffix
+OPENERS = {".gz": gzip.open, ".xz": lzma.open, ".bz2": bz2.open}
+
+# Bytes collected before a write to a shard, so compressors and disks see large blocks
+WRITE_BUFFER = 4 * 1024 * 1024
+
+# Bump when the layout of the manifest changes
+MANIFEST_VERSION = 1
+
+def is_compressed(path):
+    return os.path.splitext(path)[1] in OPENERS
+
+def find_corpus(path):
+    """
+    Returns `path` if it exists, otherwise the first of `path` + .gz/.xz/.bz2 that does
+    (or `path` itself, so "not found" errors still name the plain file).
+    """
+    if os.path.exists(path):
+        return path
+    for suffix in OPENERS:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+def open_corpus(path):
+    """
+    Opens a corpus for reading as a binary stream, decompressing .gz/.xz/.bz2 files on
+    the fly. Compressed streams can only be read from the start, in one process.
+    """
+    suffix = os.path.splitext(path)[1]
+    if suffix in OPENERS:
+        return OPENERS[suffix](path, "rb")
+    return open(path, "rb")
+
+class ShardedJsonlWriter:
+    """
+    Writes JSON records to numbered JSONL shards of at most `shard_records` records each,
+    named `<prefix>-00000.jsonl` (plus `.gz`, `.xz` or `.bz2` with a `compression`).
+    Encoded lines are collected into WRITE_BUFFER-sized blocks before they are written.
+    `close()` returns one entry per shard with its file name, record count and size.
+    """
+
+    def __init__(self, directory, prefix, shard_records=100_000, compression=None):
+        if compression is not None and "." + compression not in OPENERS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_records = shard_records
+        self.compression = compression
+        self.shards = []
+        self._file = None
+        self._pending = []
+        self._pending_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_shard(self):
+        name = f"{self.prefix}-{len(self.shards):05d}.jsonl"
+        if self.compression is None:
+            self._file = open(os.path.join(self.directory, name), "wb")
+        else:
+            name += "." + self.compression
+            self._file = OPENERS["." + self.compression](os.path.join(self.directory, name), "wb")
+        self.shards.append({"path": name, "records": 0, "uncompressed_bytes": 0})
+
+    def _flush(self):
+        if self._pending:
+            self._file.write(b"".join(self._pending))
+            self._pending = []
+            self._pending_bytes = 0
+
+    def _close_shard(self):
+        self._flush()
+        self._file.close()
+        self._file = None
+        shard = self.shards[-1]
+        shard["bytes"] = os.path.getsize(os.path.join(self.directory, shard["path"]))
+
+    def write(self, record):
+        if self._file is None:
+            self._open_shard()
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._pending.append(line)
+        self._pending_bytes += len(line)
+        shard = self.shards[-1]
+        shard["records"] += 1
+        shard["uncompressed_bytes"] += len(line)
+        if self._pending_bytes >= WRITE_BUFFER:
+            self._flush()
+        if shard["records"] >= self.shard_records:
+            self._close_shard()
+
+    def close(self):
+        if self._file is not None:
+            self._close_shard()
+        return self.shards
+
+def write_manifest(directory, groups, **meta):
+    """
+    Writes `manifest.json` next to the shards: `meta` plus, per group, its record count
+    and shards. The manifest is replaced in one step, so readers never see half of it;
+    shards that it does not list (e.g. left over from a larger earlier run) are not part
+    of the dataset.
+    """
+    manifest = {"version": MANIFEST_VERSION, **meta, "groups": {}}
+    for name, (info, shards) in groups.items():
+        manifest["groups"][name] = {**info, "records": sum(shard["records"] for shard in shards), "shards": shards}
+    path = os.path.join(directory, "manifest.json")
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return path
@@ -0,0 +1,219 @@
+import argparse
+import io
+import json
+import mmap
+import os
+import sys
+from array import array
+from collections import Counter
+
+from corpus_io import open_corpus
+from sentence_arena import decode_sentence, encode_sentence
+
+# Bump when the layout of the store changes
+STORE_VERSION = 2
+
+# Code of a missing dictionary-encoded value and value of a missing number
+MISSING_CODE = 0xFFFFFFFF
+MISSING_NUMBER = -(2 ** 63)
+
+# Columns stored as integer codes into a per-column dictionary
+DICTIONARY_COLUMNS = ["speaker_name", "protocol_name", "protocol_type"]
+# Columns stored as 64-bit integers
+NUMERIC_COLUMNS = ["kneset_number", "protocol_number"]
+
+def _typed_array(typecode, size_in_bytes):
+    # array typecodes are platform sized; the store relies on these widths
+    column = array(typecode)
+    if column.itemsize != size_in_bytes:
+        raise RuntimeError(f"array('{typecode}') is {column.itemsize} bytes here, the corpus store needs {size_in_bytes}")
+    return column
+
+def source_signature(path):
+    """
+    Size and modification time of the JSONL file a store was built from.
+    """
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def build_store(jsonl_path, store_dir):
+    """
+    Converts a JSONL corpus into a columnar store directory:
+    1. `speaker_name`, `protocol_name` and `protocol_type` become uint32 codes into
+       dictionaries kept in `meta.json` (codes follow the order of first appearance).
+    2. `kneset_number` and `protocol_number` become int64 arrays (non-integer values are
+       stored as missing).
+    3. `sentence_text` becomes one UTF-8 blob plus uint64 offsets and a presence flag
+       (a value that is not a string is kept as JSON, see sentence_arena.encode_sentence).
+    Lines that are not valid JSON are left out and their errors are kept in the metadata,
+    so readers can report them with the same line numbers.
+    Returns the number of stored rows.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+    codes = {name: _typed_array("I", 4) for name in DICTIONARY_COLUMNS}
+    numbers = {name: _typed_array("q", 8) for name in NUMERIC_COLUMNS}
+    offsets = _typed_array("Q", 8)
+    present = _typed_array("B", 1)
+    errors = []
+    offsets.append(0)
+    blob_size = 0
+    line_number = 0
+
+    with io.TextIOWrapper(open_corpus(jsonl_path), encoding="utf-8") as file, \
+            open(os.path.join(store_dir, "sentence_text.blob"), "wb") as blob:
+        for line_number, line in enumerate(file, start=1):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                errors.append((line_number, str(e)))
+                continue
+
+            for name in DICTIONARY_COLUMNS:
+                if name in record:
+                    # JSON text of the value, so non-string values survive the round trip
+                    key = json.dumps(record[name], ensure_ascii=False)
+                    codes[name].append(dictionaries[name].setdefault(key, len(dictionaries[name])))
+                else:
+                    codes[name].append(MISSING_CODE)
+            for name in NUMERIC_COLUMNS:
+                value = record.get(name)
+                numbers[name].append(value if isinstance(value, int) and not isinstance(value, bool) else MISSING_NUMBER)
+
+            if "sentence_text" in record:
+                # Non-string values keep their JSON value, as in the sentence arena
+                encoded = encode_sentence(record["sentence_text"])
+                blob.write(encoded)
+                blob_size += len(encoded)
+                present.append(1)
+            else:
+                present.append(0)
+            offsets.append(blob_size)
+
+    for name in DICTIONARY_COLUMNS:
+        with open(os.path.join(store_dir, f"{name}.codes"), "wb") as column_file:
+            codes[name].tofile(column_file)
+    for name in NUMERIC_COLUMNS:
+        with open(os.path.join(store_dir, f"{name}.int64"), "wb") as column_file:
+            numbers[name].tofile(column_file)
+    with open(os.path.join(store_dir, "sentence_text.offsets"), "wb") as column_file:
+        offsets.tofile(column_file)
+    with open(os.path.join(store_dir, "sentence_text.present"), "wb") as column_file:
+        present.tofile(column_file)
+
+    meta = {
+        "version": STORE_VERSION,
+        "byteorder": sys.byteorder,
+        "rows": len(present),
+        "lines": line_number,
+        "source": source_signature(jsonl_path),
+        "dictionaries": {name: list(values) for name, values in dictionaries.items()},
+        "errors": errors,
+    }
+    with open(os.path.join(store_dir, "meta.json"), "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file, ensure_ascii=False)
+    return len(present)
+
+class CorpusStore:
+    """
+    Read-only view of a store written by `build_store`.
+
+    Every column file is memory-mapped and exposed as a typed memoryview, so opening a
+    store costs no parsing and the operating system pages columns in as they are used.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported corpus store version in {store_dir}")
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Corpus store {store_dir} was built on a {self.meta['byteorder']}-endian machine")
+
+        self.rows = self.meta["rows"]
+        self.errors = [tuple(error) for error in self.meta["errors"]]
+        self.dictionaries = {
+            name: [json.loads(value) for value in values] for name, values in self.meta["dictionaries"].items()
+        }
+        self._maps = []
+        self.codes = {name: self._map_column(f"{name}.codes", "I") for name in DICTIONARY_COLUMNS}
+        self.numbers = {name: self._map_column(f"{name}.int64", "q") for name in NUMERIC_COLUMNS}
+        self.sentence_offsets = self._map_column("sentence_text.offsets", "Q")
+        self.sentence_present = self._map_column("sentence_text.present", "B")
+        self.sentence_blob = self._map_column("sentence_text.blob", "B")
+
+    def _map_column(self, file_name, typecode):
+        with open(os.path.join(self.store_dir, file_name), "rb") as column_file:
+            if os.fstat(column_file.fileno()).st_size == 0:
+                # Empty files cannot be mapped
+                return memoryview(array(typecode))
+            mapped = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+    def close(self):
+        for column in (*self.codes.values(), *self.numbers.values(),
+                       self.sentence_offsets, self.sentence_present, self.sentence_blob):
+            column.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_stale(self, source_path=None):
+        """
+        True if the JSONL file (by default the one the store was built from) changed
+        since the store was built.
+        """
+        if source_path is None:
+            source_path = self.meta["source"]["path"]
+        try:
+            signature = source_signature(source_path)
+        except FileNotFoundError:
+            return True
+        stored = self.meta["source"]
+        return (signature["size"], signature["mtime_ns"]) != (stored["size"], stored["mtime_ns"])
+
+    def code_counts(self, name):
+        """
+        Number of rows per dictionary code of a column (a bincount over the code array),
+        in code order. Rows without the field are not counted.
+        """
+        counts = Counter(self.codes[name])
+        counts.pop(MISSING_CODE, None)
+        return [(code, counts[code]) for code in range(len(self.dictionaries[name])) if counts[code]]
+
+    def value(self, name, row):
+        """
+        Decoded value of a dictionary column for a row, or None if the field is missing.
+        """
+        code = self.codes[name][row]
+        return None if code == MISSING_CODE else self.dictionaries[name][code]
+
+    def sentence(self, row):
+        """
+        Decoded sentence_text of a row, or None if the row has no sentence (a null
+        sentence_text is also None; `sentence_present` tells the two apart).
+        """
+        if not self.sentence_present[row]:
+            return None
+        start, end = self.sentence_offsets[row], self.sentence_offsets[row + 1]
+        return decode_sentence(bytes(self.sentence_blob[start:end]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a columnar corpus store from a JSONL file.")
+    parser.add_argument("jsonl_path", help="JSONL corpus to convert")
+    parser.add_argument("store_dir", help="directory to write the store into")
+    args = parser.parse_args(argv)
+
+    rows = build_store(args.jsonl_path, args.store_dir)
+    print(f"Stored {rows} rows from {args.jsonl_path} in {args.store_dir}")
+
+if __name__ == "__main__":
+    main()
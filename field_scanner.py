@@ -0,0 +1,33 @@
+import mmap
+import os
+
+from corpus_io import is_compressed, open_corpus
+
+def read_numbered_byte_lines(path, start=0, end=None):
+    """
+    Memory-mapped counterpart of `parallel_scan.read_numbered_lines`: yields
+    (line_number, line) pairs for the lines starting in the byte range [start, end),
+    with each line as undecoded bytes including its newline. Compressed corpora are
+    streamed through the decompressor instead.
+    """
+    if is_compressed(path):
+        if start or end is not None:
+            raise ValueError(f"{path} is compressed and can only be read from the start")
+        with open_corpus(path) as file:
+            yield from enumerate(file, start=1)
+        return
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if start >= end:
+            # Nothing to read (empty files cannot be mapped)
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as corpus:
+            position = start
+            line_number = 0
+            while position < end:
+                newline = corpus.find(b"\n", position)
+                line_end = size if newline == -1 else newline + 1
+                line_number += 1
+                yield line_number, corpus[position:line_end]
+                position = line_end
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+import print_top_5_common_speakers as top_speakers
+import res_fixer
+from field_scanner import read_numbered_byte_lines
+from heavy_hitters import top_k
+from lexicon import title_matcher
+from metrics import RunMetrics, profiled
+from parallel_scan import map_chunks, merge_counts
+
+# Stage timings and counters for --metrics-json (disabled unless requested)
+metrics = RunMetrics("fused")
+
+class TopSpeakers:
+    """
+    The counting pass of print_top_5_common_speakers.py: sentences per normalized speaker
+    name, reported as the `k` most common (ties keep the order of first appearance).
+    """
+    analysis = "top_speakers"
+    path = top_speakers.file_path
+
+    def __init__(self, k=5):
+        self.k = k
+        self.counter = defaultdict(int)
+
+    def add(self, speaker_name, count):
+        self.counter[top_speakers.cached_normalize_full_name(speaker_name)] += count
+
+    def report(self):
+        print(f"Top {self.k} speakers with most sentences:")
+        for normalized_name, count in top_k(self.counter, self.k):
+            print(f"{normalized_name}: {count}")
+
+class SurnameAudit:
+    """
+    The query of res_fixer.py: sentences whose speaker's last name is `surname`, and the
+    raw speaker names they appear under.
+    """
+    analysis = "surname"
+    path = res_fixer.file_path
+
+    def __init__(self, surname=res_fixer.SURNAME):
+        self.surname = surname
+        self.count = 0
+        self.variations = set()
+
+    def add(self, speaker_name, count):
+        if res_fixer.cached_normalize_full_name(speaker_name).split(" ")[-1] == self.surname:
+            self.count += count
+            self.variations.add(speaker_name)
+
+    def report(self):
+        print(f"Total number of sentences where the speaker's last name is '{self.surname}': {self.count}")
+        print(f"\nVarious ways '{self.surname}' appears in the speaker_name column:")
+        for variation in sorted(self.variations):
+            print(f"- {variation}")
+
+class ForbiddenTitles:
+    """
+    The audit of idan/exper.py: speaker names that contain titles or departments, in the
+    order of their first appearance.
+    """
+    analysis = "forbidden_titles"
+    path = top_speakers.file_path
+
+    def __init__(self):
+        self.forbidden_names = {}
+
+    def add(self, speaker_name, count):
+        matches = title_matcher.findall(speaker_name, whole_words=True)
+        if matches:
+            self.forbidden_names[speaker_name] = matches
+
+    def report(self):
+        print("Names with Forbidden Words and Reasons:")
+        for name, reasons in self.forbidden_names.items():
+            print(f"{name}: Forbidden because it contains {', '.join(reasons)}")
+
+# The analyses the driver knows, by name. A consumer has a default input `path`, gets
+# every distinct raw speaker name of that input once through `add(speaker_name, count)`
+# (in the order of first appearance) and prints its results in `report()`.
+ANALYSES = {
+    "top_speakers": lambda args: TopSpeakers(args.top),
+    "surname": lambda args: SurnameAudit(args.surname),
+    "forbidden_titles": lambda args: ForbiddenTitles(),
+}
+
+def count_raw_names(lines):
+    """
+    Counts the sentences of every raw speaker name. Takes (line_number, line) pairs with
+    the lines as bytes and also returns the JSON decoding errors.
+    """
+    raw_counts = defaultdict(int)
+    errors = []
+    for line_number, line in lines:
+        try:
+            record = json.loads(line)
+            if "speaker_name" in record:
+                raw_counts[record["speaker_name"]] += 1
+        except json.JSONDecodeError as e:
+            errors.append((line_number, str(e)))
+    return raw_counts, errors
+
+def scan_file(path, consumers, workers=1):
+    """
+    Reads `path` once and feeds the raw name counts to every consumer, so the line parsing
+    is shared and each consumer normalizes a name once however often it occurs. Returns
+    the JSON decoding errors with file line numbers.
+    """
+    chunks = map_chunks(count_raw_names, path, workers, reader=read_numbered_byte_lines, on_lines=metrics.stage_lines)
+    errors = []
+    for line_offset, (raw_counts, chunk_errors) in chunks:
+        errors.extend((line_offset + line_number, message) for line_number, message in chunk_errors)
+    raw_counts = merge_counts(raw_counts for line_offset, (raw_counts, chunk_errors) in chunks)
+    for speaker_name, count in raw_counts.items():
+        for consumer in consumers:
+            consumer.add(speaker_name, count)
+    metrics.add("distinct_speaker_names", len(raw_counts))
+    return errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the top speaker count, the surname query and the forbidden title audit "
+                    "with a single scan per input file."
+    )
+    parser.add_argument(
+        "--analyses", nargs="+", choices=list(ANALYSES), default=list(ANALYSES), metavar="NAME",
+        help=f"analyses to run (default: all of {', '.join(ANALYSES)})",
+    )
+    parser.add_argument(
+        "--corpus", metavar="PATH",
+        help="read every analysis from this JSONL file instead of its default input",
+    )
+    parser.add_argument("--top", type=int, default=5, metavar="K", help="number of top speakers to report")
+    parser.add_argument("--surname", default=res_fixer.SURNAME, help="last name to look for (default: %(default)s)")
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="scan newline-aligned chunks of each input in N processes",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH",
+        help="write stage timings, lines/sec, error counts and peak memory to PATH ('-' for stdout)",
+    )
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="run under cProfile and save the stats to PATH (view with: python -m pstats PATH)",
+    )
+    args = parser.parse_args(argv)
+    if args.top < 1:
+        parser.error("--top must be at least 1")
+
+    if args.metrics_json is not None:
+        metrics.enable()
+    try:
+        with profiled(args.profile):
+            run_analyses(args)
+    finally:
+        metrics.set("name_cache", {
+            "top_speakers": top_speakers.cached_normalize_full_name.stats(),
+            "surname": res_fixer.cached_normalize_full_name.stats(),
+        })
+        metrics.write(args.metrics_json)
+
+def run_analyses(args):
+    consumers = [ANALYSES[name](args) for name in args.analyses]
+
+    # Group the consumers by input file, so every file is read once
+    inputs = {}
+    for consumer in consumers:
+        path = os.path.realpath(args.corpus or consumer.path)
+        inputs.setdefault(path, []).append(consumer)
+
+    for path, path_consumers in inputs.items():
+        print(f"Scanning {path} for: {', '.join(consumer.analysis for consumer in path_consumers)}")
+        metrics.lap(f"scan:{os.path.basename(path)}")
+        try:
+            errors = scan_file(path, path_consumers, args.workers)
+        except FileNotFoundError:
+            print(f"Error: File not found at {path}")
+            sys.exit(1)
+        metrics.add("json_errors", len(errors))
+        for line_number, message in errors:
+            print(f"JSON decoding error in {os.path.basename(path)} on line {line_number}: {message}")
+
+    metrics.lap("report")
+    for consumer in consumers:
+        print(f"\n=== {consumer.analysis} ===")
+        consumer.report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import heapq
+from operator import itemgetter
+
+def top_k(counts, k):
+    """
+    The `k` (key, count) pairs with the highest counts, from anything with `items()`.
+    Ties keep the iteration order, exactly like sorting everything and taking `[:k]`,
+    but without sorting the whole counter.
+    """
+    return heapq.nlargest(k, counts.items(), key=itemgetter(1))
+
+class SpaceSaving:
+    """
+    Space-Saving summary (Metwally et al.): approximate counts of the most frequent keys
+    of a stream in at most `capacity` entries.
+
+    A key that is not monitored replaces the one with the lowest count and inherits that
+    count as its `error`. Every reported count is an upper bound and `count - error` a
+    lower bound of the true count; every key seen more than `total / capacity` times is
+    monitored. While the stream has at most `capacity` distinct keys nothing is replaced
+    and all counts are exact.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        self.evictions = 0
+        # Bound of the count of keys a merge dropped before they were ever monitored
+        self._floor = 0
+        # One (count, key) entry per monitored key; an entry may lag behind its key's
+        # count, since counts only grow it is refreshed when it reaches the top
+        self._heap = []
+
+    def add(self, key, count=1):
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+            return
+        if len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (count, key))
+            return
+        minimum, evicted = self._pop_minimum()
+        del counts[evicted]
+        del self.errors[evicted]
+        self.evictions += 1
+        counts[key] = minimum + count
+        self.errors[key] = minimum
+        heapq.heappush(self._heap, (minimum + count, key))
+
+    def _pop_minimum(self):
+        heap = self._heap
+        while True:
+            count, key = heap[0]
+            current = self.counts[key]
+            if count == current:
+                return heapq.heappop(heap)
+            heapq.heapreplace(heap, (current, key))
+
+    def __getitem__(self, key):
+        return self.counts[key]
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def items(self):
+        return self.counts.items()
+
+    def minimum(self):
+        """
+        Upper bound of the true count of any key that is not monitored.
+        """
+        if len(self.counts) < self.capacity:
+            return self._floor
+        return max(self._floor, min(self.counts.values()))
+
+    def top(self, k):
+        """
+        The `k` highest (key, count, error) triples, and whether they are guaranteed to be
+        the true top k: the lowest lower bound among them is at least the upper bound of
+        every other key, monitored or not. (A higher-ranked key can have a larger error
+        than the last one, so checking the last one alone is not enough.)
+        """
+        ranked = top_k(self.counts, k + 1)
+        top = [(key, count, self.errors[key]) for key, count in ranked[:k]]
+        challenger = max(ranked[k][1] if len(ranked) > k else 0, self.minimum())
+        if len(top) < k:
+            # Fewer keys than k are monitored: exact only if no other key can exist
+            return top, challenger == 0
+        return top, min(count - error for key, count, error in top) >= challenger
+
+    @classmethod
+    def merged(cls, summaries, capacity):
+        """
+        Merges summaries of consecutive parts of a stream (e.g. file chunks) into one of
+        `capacity` entries. A key missing from a full summary may have been seen up to that
+        summary's minimum there, which is added to its count and its error; keys keep the
+        order of their first appearance.
+        """
+        merged = cls(capacity)
+        counts = {}
+        errors = {}
+        # Bound of what a key may have had in the summaries before it first shows up
+        unseen = 0
+        for summary in summaries:
+            missing = summary.minimum()
+            if missing:
+                for key in counts:
+                    if key not in summary.counts:
+                        counts[key] += missing
+                        errors[key] += missing
+            for key, count in summary.counts.items():
+                if key in counts:
+                    counts[key] += count
+                    errors[key] += summary.errors[key]
+                else:
+                    counts[key] = unseen + count
+                    errors[key] = unseen + summary.errors[key]
+            unseen += missing
+            merged.total += summary.total
+            merged.evictions += summary.evictions
+
+        kept = {key for key, count in top_k(counts, capacity)}
+        merged.evictions += len(counts) - len(kept)
+        for key, count in counts.items():
+            if key in kept:
+                merged.counts[key] = count
+                merged.errors[key] = errors[key]
+                merged._heap.append((count, key))
+        heapq.heapify(merged._heap)
+        merged._floor = unseen
+        return merged
@@ -1,55 +1,159 @@
+import argparse
 import json
-import re
 import os
+import sys
+
+# The shared lexicon lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import checkpoint_path, count_newlines, plan_resume, save_checkpoint
+from corpus_io import find_corpus, is_compressed
+from corpus_store import CorpusStore
+from field_scanner import read_numbered_byte_lines
+from lexicon import departments, title_matcher, titles
+from metrics import RunMetrics, profiled
+from name_cache import rules_fingerprint
+from parallel_scan import map_chunks
 
 # Define the relative path to the file
-file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "result.jsonl")
-
-# Forbidden words: titles and departments
-titles = [
-    '<<.*>>', 'תשובת', 'הד"ר', 'ד"ר', 'מ"מ היו"ר', 'היו"ר', 'יו"ר', 'נשיא הפרלמנט האירופי', 'שר', 'שרת',
-    'עו"ד', 'המשנה לראש הממשלה', 'משנה לראש הממשלה', 'ראש הממשלה', 'נצ"מ', 'מר', 'ניצב', 'טפסר משנה', 'רשף',
-    "פרופ'", 'סגן', 'סגנית', 'השר', 'השרה', 'מזכיר', 'מזכירת', 'ועדת'
-]
-departments = [
-    'הכנסת', 'הכלכלה', 'הכלכלה והתכנון', 'האנרגיה והמים', 'החינוך', 'החינוך והתרבות',
-    'התשתיות הלאומיות', 'התשתיות הלאומיות, האנרגיה והמים', 'חינוך', 'המודיעין', 'לשיתוף פעולה אזורי',
-    'ההסברה והתפוצות', 'האוצר', 'להגנת הסביבה', 'התעשייה, המסחר והתעסוקה', 'לאיכות הסביבה',
-    'התרבות והספורט', 'התשתיות', 'המשפטים', 'הרווחה', 'הרווחה והשירותים החברתיים', 'הבינוי והשיכון',
-    'התחבורה והבטיחות בדרכים', 'המשטרה', 'הבריאות', 'החקלאות ופיתוח הכפר', 'התקשורת',
-    'במשרד ראש הממשלה', 'הפנים', 'הביטחון', 'לביטחון פנים', 'המדע והטכנולוגיה', 'העלייה והקליטה',
-    'לקליטת העלייה', 'התיירות', 'החוץ', 'המדע,', 'למודיעין', 'לאזרחים ותיקים', 'לענייני דתות', 'לענייני מודיעין',
-    'המדע', 'התרבות', 'הספורט', 'תרבות', 'ספורט'
-]
-
-# Compile a regex pattern to match forbidden words as whole words
-forbidden_pattern = re.compile(rf"\b({'|'.join(map(re.escape, titles + departments))})\b")
-
-# Read and process the JSONL file
-forbidden_names = {}
-
-try:
-    with open(file_path, "r", encoding="utf-8") as file:
-        for line in file:
-            try:
-                # Parse each line as JSON
-                record = json.loads(line)
-                if "speaker_name" in record:
-                    speaker_name = record["speaker_name"]
-                    # Find all forbidden words in the name
-                    matches = forbidden_pattern.findall(speaker_name)
-                    if matches:
-                        forbidden_names[speaker_name] = matches
-            except json.JSONDecodeError:
-                continue
-except FileNotFoundError:
-    print(f"Error: File not found at {file_path}")
-    exit()
-
-# Print all names containing forbidden words and the reason
-print("Names with Forbidden Words and Reasons:")
-for name, reasons in forbidden_names.items():
-    print(f"{name}: Forbidden because it contains {', '.join(reasons)}")
+# (or its .gz, .xz or .bz2 archive when there is no uncompressed copy)
+file_path = find_corpus(os.path.join(os.path.dirname(os.path.dirname(__file__)), "result.jsonl"))
+
+# Stage timings and counters for --metrics-json (disabled unless requested)
+metrics = RunMetrics("forbidden")
+
+def find_forbidden_names(lines):
+    """
+    Maps every speaker name that contains forbidden words to the words it contains.
+    Takes (line_number, line) pairs with the lines as bytes; lines that are not valid
+    JSON are skipped and returned as the count of JSON errors.
+    """
+    forbidden_names = {}
+    json_errors = 0
+    for line_number, line in lines:
+        try:
+            # Parse each line as JSON
+            record = json.loads(line)
+            if "speaker_name" in record:
+                speaker_name = record["speaker_name"]
+                # Find all forbidden words in the name
+                matches = title_matcher.findall(speaker_name, whole_words=True)
+                if matches:
+                    forbidden_names[speaker_name] = matches
+        except json.JSONDecodeError:
+            json_errors += 1
+    return forbidden_names, json_errors
+
+def find_forbidden_names_in_store(store):
+    """
+    Same check over a columnar corpus store, once per distinct raw speaker name
+    (the dictionary keeps the order of first appearance).
+    """
+    forbidden_names = {}
+    for speaker_name in store.dictionaries["speaker_name"]:
+        matches = title_matcher.findall(speaker_name, whole_words=True)
+        if matches:
+            forbidden_names[speaker_name] = matches
+    return forbidden_names, len(store.errors)
+
+def find_forbidden_names_checkpointed(checkpoint_file, workers=1):
+    """
+    Scans only the lines appended since the checkpoint was saved (everything if it is
+    missing or the file was rewritten), then saves a checkpoint up to the last complete line.
+    """
+    fingerprint = "forbidden:" + rules_fingerprint(titles, departments)
+    saved, start, line_offset, end = plan_resume(checkpoint_file, file_path, fingerprint)
+    forbidden_names = {}
+    json_errors = 0
+    if saved is not None:
+        print(f"Resuming from checkpoint at line {line_offset}")
+        forbidden_names.update(saved["state"]["forbidden_names"])
+        json_errors = saved["state"]["json_errors"]
+    for chunk_offset, (chunk_names, chunk_errors) in map_chunks(find_forbidden_names, file_path, workers,
+                                                                start=start, end=end, reader=read_numbered_byte_lines,
+                                                                on_lines=metrics.stage_lines):
+        forbidden_names.update(chunk_names)
+        json_errors += chunk_errors
+
+    lines = line_offset + count_newlines(file_path, start, end)
+    save_checkpoint(checkpoint_file, file_path, fingerprint, end, lines,
+                    {"forbidden_names": forbidden_names, "json_errors": json_errors})
+
+    # A last line without a newline may still be growing: scan it, but not into the checkpoint
+    tail = map_chunks(find_forbidden_names, file_path, start=end, reader=read_numbered_byte_lines,
+                      on_lines=metrics.stage_lines)
+    return [(0, (forbidden_names, json_errors))] + tail
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List speaker names that contain titles or departments.")
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="scan newline-aligned chunks of the corpus in N processes",
+    )
+    parser.add_argument(
+        "--store", metavar="DIR",
+        help="read a columnar corpus store built by corpus_store.py instead of parsing the JSONL file",
+    )
+    parser.add_argument(
+        "--checkpoint", nargs="?", const=checkpoint_path(file_path, "forbidden"), default=None, metavar="PATH",
+        help="save the results to PATH (default: next to the corpus) and on later runs scan only "
+             "the lines appended since then",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH",
+        help="write stage timings, lines/sec, error counts, cache hit rate and peak memory to PATH ('-' for stdout)",
+    )
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="run under cProfile and save the stats to PATH (view with: python -m pstats PATH)",
+    )
+    args = parser.parse_args(argv)
+    if args.store and args.checkpoint:
+        parser.error("--checkpoint cannot be combined with --store")
+    if args.checkpoint and is_compressed(file_path):
+        parser.error(f"--checkpoint needs random access and cannot read the compressed {file_path}")
+    if args.metrics_json is not None:
+        metrics.enable()
+        # Time spent matching titles and departments in this process
+        title_matcher.findall = metrics.timed("match", title_matcher.findall)
+    try:
+        with profiled(args.profile):
+            run_analysis(args)
+    finally:
+        metrics.write(args.metrics_json)
+
+def run_analysis(args):
+
+    # Read and process the JSONL file (or its columnar store)
+    metrics.lap("scan")
+    try:
+        if args.store:
+            with CorpusStore(args.store) as store:
+                chunks = [(0, find_forbidden_names_in_store(store))]
+        elif args.checkpoint:
+            chunks = find_forbidden_names_checkpointed(args.checkpoint, args.workers)
+        else:
+            chunks = map_chunks(find_forbidden_names, file_path, args.workers, reader=read_numbered_byte_lines,
+                                on_lines=metrics.stage_lines)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.store or file_path}")
+        exit()
+
+    # Merge the chunks in file order, so names keep the order of their first appearance
+    forbidden_names = {}
+    json_errors = 0
+    for line_offset, (chunk_names, chunk_errors) in chunks:
+        forbidden_names.update(chunk_names)
+        json_errors += chunk_errors
 
+    metrics.lap("report")
+    metrics.set("json_errors", json_errors)
+    metrics.set("forbidden_names", len(forbidden_names))
 
+    # Print all names containing forbidden words and the reason
+    print("Names with Forbidden Words and Reasons:")
+    for name, reasons in forbidden_names.items():
+        print(f"{name}: Forbidden because it contains {', '.join(reasons)}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import re
+
+# Bump whenever a change to the matching or normalization code can change the canonical
+# name of a speaker, so name tables, line indexes and checkpoints built by the old code
+# are not reused (see name_cache.rules_fingerprint)
+NORMALIZER_VERSION = 2
+
+# Titles and departments to remove from names (shared by all the scripts)
+titles = [
+    '<<.*>>', 'תשובת', 'הד"ר', 'ד"ר', 'מ"מ היו"ר', 'היו"ר', 'יו"ר', 'נשיא הפרלמנט האירופי', 'שר', 'שרת',
+    'עו"ד', 'המשנה לראש הממשלה', 'משנה לראש הממשלה', 'ראש הממשלה', 'נצ"מ', 'מר', 'ניצב', 'טפסר משנה', 'רשף',
+    "פרופ'", 'סגן', 'סגנית', 'השר', 'השרה', 'מזכיר', 'מזכירת', 'ועדת'
+]
+departments = [
+    'הכנסת', 'הכלכלה', 'הכלכלה והתכנון', 'האנרגיה והמים', 'החינוך', 'החינוך והתרבות',
+    'התשתיות הלאומיות', 'התשתיות הלאומיות, האנרגיה והמים', 'חינוך', 'המודיעין', 'לשיתוף פעולה אזורי',
+    'ההסברה והתפוצות', 'האוצר', 'להגנת הסביבה', 'התעשייה, המסחר והתעסוקה', 'לאיכות הסביבה',
+    'התרבות והספורט', 'התשתיות', 'המשפטים', 'הרווחה', 'הרווחה והשירותים החברתיים', 'הבינוי והשיכון',
+    'התחבורה והבטיחות בדרכים', 'המשטרה', 'הבריאות', 'החקלאות ופיתוח הכפר', 'התקשורת',
+    'במשרד ראש הממשלה', 'הפנים', 'הביטחון', 'לביטחון פנים', 'המדע והטכנולוגיה', 'העלייה והקליטה',
+    'לקליטת העלייה', 'התיירות', 'החוץ', 'המדע,', 'למודיעין', 'לאזרחים ותיקים', 'לענייני דתות', 'לענייני מודיעין',
+    'המדע', 'התרבות', 'הספורט', 'תרבות', 'ספורט'
+]
+
+class TermMatcher:
+    """
+    Matches a fixed list of literal terms with one compiled alternation whose terms are
+    sorted longest first. The regex engine takes the first alternative that matches at
+    the leftmost position, so overlapping matches are resolved leftmost-longest: 'השר'
+    wins over 'שר' and 'הכלכלה והתכנון' over 'הכלכלה' regardless of the order of the
+    term lists.
+    """
+
+    def __init__(self, terms):
+        self.terms = [term for term in dict.fromkeys(terms) if term]
+        alternatives = "|".join(map(re.escape, sorted(self.terms, key=len, reverse=True))) or "(?!)"
+        self._pattern = re.compile(f"(?:{alternatives})")
+        # A match must also start and end on a word boundary, as `\b` in idan/exper.py did
+        self._word_pattern = re.compile(rf"\b(?:{alternatives})\b")
+
+    def find(self, text, whole_words=False):
+        """
+        Returns the (start, end) spans of the non-overlapping leftmost-longest matches.
+        With `whole_words`, a match must also start and end on a word boundary.
+        """
+        pattern = self._word_pattern if whole_words else self._pattern
+        return [match.span() for match in pattern.finditer(text)]
+
+    def findall(self, text, whole_words=False):
+        """
+        Returns the matched terms in order of appearance.
+        """
+        return (self._word_pattern if whole_words else self._pattern).findall(text)
+
+    def strip(self, text):
+        """
+        Returns the text with every matched term removed.
+        """
+        return self._pattern.sub("", text)
+
+# Built once per process and shared by every script
+title_matcher = TermMatcher(titles + departments)
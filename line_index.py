@@ -0,0 +1,155 @@
+import json
+import mmap
+import os
+import random
+from array import array
+from collections import defaultdict
+
+# Bump when the layout of the index changes
+INDEX_VERSION = 1
+
+def index_path(corpus_path):
+    """
+    Default location of the line-offset index for a corpus file.
+    """
+    return corpus_path + ".lineidx"
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def build_line_index(corpus_path, normalize, path, fingerprint):
+    """
+    Scans the corpus once and writes a sidecar index of byte offsets per line, grouped by
+    normalized speaker. The file starts with a JSON header (padded to 8 bytes) that lists
+    the speakers in order of first appearance with their record and sentence counts,
+    followed by one uint64 offset array per speaker for its lines with a sentence_text.
+    Returns the JSON decoding errors of the scan.
+    """
+    speaker_counts = defaultdict(int)
+    sentence_offsets = defaultdict(lambda: array("Q"))
+    errors = []
+
+    with open(corpus_path, "rb") as file:
+        position = 0
+        for line_number, line in enumerate(file, start=1):
+            offset = position
+            position += len(line)
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except json.JSONDecodeError as e:
+                errors.append((line_number, str(e)))
+                continue
+            if "speaker_name" not in record:
+                continue
+            normalized_name = normalize(record["speaker_name"])
+            speaker_counts[normalized_name] += 1
+            if "sentence_text" in record:
+                sentence_offsets[normalized_name].append(offset)
+
+    header = {
+        "version": INDEX_VERSION,
+        "fingerprint": fingerprint,
+        "source": _source_signature(corpus_path),
+        "speakers": [[name, count, len(sentence_offsets.get(name, ()))] for name, count in speaker_counts.items()],
+        "errors": errors,
+    }
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n"
+    encoded += b" " * (-len(encoded) % 8)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as index_file:
+        index_file.write(encoded)
+        for name in speaker_counts:
+            if name in sentence_offsets:
+                sentence_offsets[name].tofile(index_file)
+    os.replace(temp_path, path)
+    return errors
+
+class LineIndex:
+    """
+    Memory-mapped view of an index written by `build_line_index`.
+    `offsets[speaker]` is a uint64 memoryview of the byte offsets of the speaker's sentences.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as index_file:
+            self.header = json.loads(index_file.readline().decode("utf-8"))
+            header_size = index_file.tell()
+            header_size += -header_size % 8
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.speaker_counts = {}
+        self.sentence_counts = {}
+        self.offsets = {}
+        self._view = memoryview(self._map)[header_size:]
+        position = 0
+        for name, count, sentences in self.header["speakers"]:
+            self.speaker_counts[name] = count
+            self.sentence_counts[name] = sentences
+            self.offsets[name] = self._view[position:position + 8 * sentences].cast("Q")
+            position += 8 * sentences
+        self.errors = [tuple(error) for error in self.header["errors"]]
+
+    def close(self):
+        for view in self.offsets.values():
+            view.release()
+        self.offsets = {}
+        self._view.release()
+        self._map.close()
+
+    def matches(self, corpus_path, fingerprint):
+        """
+        True if the index was built from the current corpus file with the same rules.
+        """
+        return (self.header.get("version") == INDEX_VERSION
+                and self.header.get("fingerprint") == fingerprint
+                and self.header.get("source") == _source_signature(corpus_path))
+
+def load_or_build_line_index(corpus_path, normalize, path, fingerprint):
+    """
+    Returns the index at `path`, rebuilding it first if it is missing or out of date,
+    and whether it was rebuilt.
+    """
+    if os.path.exists(path):
+        index = LineIndex(path)
+        if index.matches(corpus_path, fingerprint):
+            return index, False
+        index.close()
+    build_line_index(corpus_path, normalize, path, fingerprint)
+    return LineIndex(path), True
+
+def sample_offsets(offset_groups, target_size):
+    """
+    Picks `target_size` offsets uniformly at random from the concatenation of the groups
+    without copying them. Returns the chosen offsets and how many were left out.
+    """
+    total = sum(len(group) for group in offset_groups)
+    if total <= target_size:
+        return [offset for group in offset_groups for offset in group], 0
+    chosen = []
+    positions = sorted(random.sample(range(total), target_size))
+    group_iter = iter(offset_groups)
+    group = next(group_iter)
+    group_start = 0
+    for position in positions:
+        while position >= group_start + len(group):
+            group_start += len(group)
+            group = next(group_iter)
+        chosen.append(group[position - group_start])
+    return chosen, total - target_size
+
+def read_sentences(corpus_path, offsets):
+    """
+    Reads back the sentence_text of the lines starting at the given byte offsets.
+    """
+    sentences = []
+    if not offsets:
+        return sentences
+    with open(corpus_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as corpus:
+            for offset in sorted(offsets):
+                end = corpus.find(b"\n", offset)
+                if end == -1:
+                    end = len(corpus)
+                sentences.append(json.loads(corpus[offset:end].decode("utf-8"))["sentence_text"])
+    return sentences
@@ -0,0 +1,159 @@
+import cProfile
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident set size in MB of this process (or of its largest finished child
+    process, e.g. a pool worker), or None if the platform does not report it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def profiled(path):
+    """
+    Context manager that runs its body under cProfile and dumps the stats to `path`
+    (readable with `python -m pstats`); does nothing if `path` is None.
+    """
+    if path is None:
+        return nullcontext()
+    return _Profile(path)
+
+class _Profile:
+    def __init__(self, path):
+        self.path = path
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler.enable()
+        return self.profiler
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.path)
+
+class RunMetrics:
+    """
+    Wall time per stage and counters of a run, written as JSON by `--metrics-json`.
+
+    Stages are consecutive laps: `lap(name)` ends the running stage and starts the next
+    one. Nothing is measured per line; a disabled instance returns from every call right
+    away, so the scripts call it unconditionally.
+    """
+
+    def __init__(self, script, enabled=False):
+        self.script = script
+        self.enabled = enabled
+        self.stages = []
+        self.counters = {}
+        self._stage = None
+        self._started = time.perf_counter()
+
+    def enable(self):
+        """
+        Turns measuring on; the total time of the run counts from here.
+        """
+        self.enabled = True
+        self._started = time.perf_counter()
+
+    def lap(self, name):
+        """
+        Ends the running stage (if any) and starts timing `name`.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._end_stage(now)
+        self._stage = {"stage": name, "started": now}
+
+    def finish(self):
+        """
+        Ends the running stage.
+        """
+        if self.enabled:
+            self._end_stage(time.perf_counter())
+
+    def _end_stage(self, now):
+        if self._stage is None:
+            return
+        stage = self._stage
+        stage["seconds"] = now - stage.pop("started")
+        if "lines" in stage:
+            stage["lines_per_sec"] = stage["lines"] / stage["seconds"] if stage["seconds"] else None
+        self.stages.append(stage)
+        self._stage = None
+
+    def stage_lines(self, lines):
+        """
+        Adds `lines` to the lines read by the running stage, for lines/sec. Scans pass it
+        as `map_chunks(..., on_lines=metrics.stage_lines)`, so the count comes from the
+        scan itself instead of another read of the file.
+        """
+        if self.enabled and self._stage is not None:
+            self._stage["lines"] = self._stage.get("lines", 0) + lines
+
+    def set(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def add(self, name, value):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed(self, name, function):
+        """
+        Returns `function` wrapped to add its calls and run time to the counters
+        `<name>_calls` and `<name>_seconds`, or `function` itself when disabled.
+        """
+        if not self.enabled:
+            return function
+        counters = self.counters
+        counters.setdefault(f"{name}_calls", 0)
+        counters.setdefault(f"{name}_seconds", 0.0)
+
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counters[f"{name}_seconds"] += time.perf_counter() - start
+                counters[f"{name}_calls"] += 1
+        return timed_function
+
+    def report(self):
+        self.finish()
+        total = time.perf_counter() - self._started
+        counters = dict(self.counters)
+        for name in [name for name in counters if name.endswith("_seconds")]:
+            counters[name[:-len("_seconds")] + "_share"] = counters[name] / total if total else None
+        return {
+            "script": self.script,
+            "total_seconds": total,
+            "stages": self.stages,
+            "counters": counters,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb(children=True),
+        }
+
+    def write(self, path):
+        """
+        Writes the report to `path` ("-" for stdout).
+        """
+        if not self.enabled:
+            return
+        text = json.dumps(self.report(), ensure_ascii=False, indent=2)
+        if path == "-":
+            print(text)
+        else:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(text + "\n")
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from lexicon import NORMALIZER_VERSION
+
+# Bump when the sidecar layout changes
+SIDECAR_VERSION = 1
+
+def rules_fingerprint(*rules):
+    """
+    Returns a hash of the normalization rules (titles, departments, name maps...) and of
+    the version of the normalization code. A saved name table is only reused while the
+    fingerprint is unchanged.
+    """
+    payload = json.dumps([NORMALIZER_VERSION, rules], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def sidecar_path(corpus_path):
+    """
+    Default location of the raw-to-canonical name table for a corpus file.
+    """
+    return corpus_path + ".names.json"
+
+class NormalizationCache:
+    """
+    Memoizes a speaker-name normalization function.
+
+    A corpus has only a few thousand distinct raw speaker names spread over millions of
+    lines, so every distinct name is normalized once and looked up afterwards. The cache
+    keeps at most `max_size` names (least recently used are dropped first) and counts hits
+    and misses. The resolved table can be saved as a sidecar file and loaded by later runs,
+    as long as it was built with the same rules fingerprint.
+    """
+
+    def __init__(self, normalize, fingerprint, max_size=100_000):
+        self.normalize = normalize
+        self.fingerprint = fingerprint
+        self.max_size = max_size
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, raw_name):
+        try:
+            canonical = self.table[raw_name]
+        except KeyError:
+            self.misses += 1
+            canonical = self.normalize(raw_name)
+            self.table[raw_name] = canonical
+            if len(self.table) > self.max_size:
+                self.table.popitem(last=False)
+                self.evictions += 1
+            return canonical
+        self.hits += 1
+        self.table.move_to_end(raw_name)
+        return canonical
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.table),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def merge(self, names, hits=0, misses=0):
+        """
+        Adds (raw, canonical) pairs resolved elsewhere, e.g. by worker processes,
+        together with the lookups they counted.
+        """
+        for raw_name, canonical in names:
+            self.table[raw_name] = canonical
+        while len(self.table) > self.max_size:
+            self.table.popitem(last=False)
+            self.evictions += 1
+        self.hits += hits
+        self.misses += misses
+
+    def load(self, path):
+        """
+        Loads a saved name table. Returns False (and keeps the cache as is) if the file
+        is missing, unreadable, or was built with different normalization rules.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                sidecar = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if sidecar.get("version") != SIDECAR_VERSION or sidecar.get("fingerprint") != self.fingerprint:
+            return False
+        for raw_name, canonical in sidecar["names"]:
+            self.table[raw_name] = canonical
+        while len(self.table) > self.max_size:
+            self.table.popitem(last=False)
+        return True
+
+    def save(self, path):
+        """
+        Saves the current raw-to-canonical table next to the corpus.
+        """
+        sidecar = {
+            "version": SIDECAR_VERSION,
+            "fingerprint": self.fingerprint,
+            "names": list(self.table.items()),
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(sidecar, file, ensure_ascii=False)
+        os.replace(temp_path, path)
@@ -0,0 +1,493 @@
+import argparse
+import heapq
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from array import array
+from collections import Counter, defaultdict
+from itertools import groupby
+
+import print_top_5_common_speakers as top_speakers
+from corpus_store import _typed_array, source_signature
+from field_scanner import read_numbered_byte_lines
+from heavy_hitters import top_k
+from metrics import peak_rss_mb
+
+# Bump when the layout of the feature store changes
+FEATURES_VERSION = 1
+
+# Items collected per column before they are written out
+WRITE_BLOCK = 1 << 20
+
+# Hebrew points and cantillation marks are dropped before tokenizing; the maqaf and the
+# other punctuation in that block split words like any other punctuation
+POINTS = re.compile("[\u0591-\u05bd\u05bf\u05c1\u05c2\u05c4\u05c5\u05c7]")
+# A word, keeping the geresh or gershayim of abbreviations and acronyms (צה"ל, ח"כ, מס')
+TOKEN = re.compile(r"\w+(?:[\"'׳״]\w+)*['׳]?")
+
+def tokenize(text):
+    return TOKEN.findall(POINTS.sub("", text).lower())
+
+def term_counts(tokens, bigrams=True):
+    """
+    Occurrences of every unigram and (with `bigrams`) every pair of adjacent tokens, joined
+    by a space, in a tokenized sentence.
+    """
+    counts = Counter(tokens)
+    if bigrams:
+        counts.update(map(" ".join, zip(tokens, tokens[1:])))
+    return counts
+
+class _ColumnWriter:
+    """
+    Appends items to an array file, writing them in blocks of WRITE_BLOCK items.
+    """
+
+    def __init__(self, path, typecode, size):
+        self.file = open(path, "wb")
+        self.items = _typed_array(typecode, size)
+
+    def extend(self, items):
+        self.items.extend(items)
+        if len(self.items) >= WRITE_BLOCK:
+            self.flush()
+
+    def flush(self):
+        self.items.tofile(self.file)
+        del self.items[:]
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def _read_items(file, typecode, count):
+    # Reads the next `count` items (fewer at the end) of an array file
+    items = array(typecode)
+    try:
+        items.fromfile(file, count)
+    except EOFError:
+        # fromfile keeps the items it did read
+        pass
+    return items
+
+def _run_items(keys_file, counts_file, start, end, buffer_items):
+    # Streams the (key, count) pairs of items [start, end) of two uint64 files, a buffer
+    # at a time; the files can be shared with other runs since every read seeks first
+    while start < end:
+        count = min(buffer_items, end - start)
+        keys_file.seek(start * 8)
+        counts_file.seek(start * 8)
+        yield from zip(_read_items(keys_file, "Q", count), _read_items(counts_file, "Q", count))
+        start += count
+
+def _summed_runs(keys_file, counts_file, bounds):
+    # Merges the sorted runs between consecutive `bounds` and sums the counts of equal keys
+    buffer_items = max(1024, WRITE_BLOCK // max(1, len(bounds) - 1))
+    runs = [_run_items(keys_file, counts_file, start, end, buffer_items) for start, end in zip(bounds, bounds[1:])]
+    current, total = None, 0
+    for key, count in heapq.merge(*runs):
+        if key != current:
+            if current is not None:
+                yield current, total
+            current, total = key, 0
+        total += count
+    if current is not None:
+        yield current, total
+
+class FeatureBuilder:
+    """
+    Builds a feature store while the corpus is scanned: every sentence is tokenized once
+    and its sparse term counts are spilled to disk in blocks, so memory holds the
+    vocabulary and one block per column instead of the whole matrix.
+
+    Terms get provisional ids in the order of first appearance. Whenever the vocabulary
+    grows past `max_vocab` terms it is pruned: the terms seen at most `prune_threshold`
+    times are dropped, raising the threshold by one until the vocabulary is back to three
+    quarters of `max_vocab` (so the next sentence does not prune again). A pruned term
+    that shows up again starts over under a new id; its earlier occurrences are left out
+    of the features and its count only covers the occurrences since.
+
+    The per-speaker totals are summed in a table of at most `max_vocab` (speaker, term)
+    pairs, which is spilled to disk as a sorted run whenever it fills up; the runs are
+    merged when the totals are written.
+    """
+
+    def __init__(self, store_dir, max_vocab=1_000_000, bigrams=True):
+        if max_vocab < 1:
+            raise ValueError("max_vocab must be at least 1")
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.max_vocab = max_vocab
+        self.bigrams = bigrams
+        self.vocabulary = {}    # term -> provisional id
+        self.counts = {}        # provisional id -> occurrences, for the terms in the vocabulary
+        self.speakers = {}      # normalized speaker -> code, in the order of first appearance
+        self.rows = 0
+        self.peak_vocab = 0
+        self.prune_threshold = 0
+        self.prunes = 0
+        self.pruned_terms = 0
+        self.pruned_occurrences = 0
+        self._next_id = 0
+        self._line_numbers = _ColumnWriter(self._path("line_numbers.uint64"), "Q", 8)
+        self._speaker_codes = _ColumnWriter(self._path("speakers.codes"), "I", 4)
+        self._lengths = _ColumnWriter(self._path("lengths.tmp"), "I", 4)
+        self._indices = _ColumnWriter(self._path("indices.tmp"), "Q", 8)
+        self._data = _ColumnWriter(self._path("data.tmp"), "I", 4)
+
+    def _path(self, file_name):
+        return os.path.join(self.store_dir, file_name)
+
+    def add(self, line_number, speaker, text):
+        vocabulary = self.vocabulary
+        counts = self.counts
+        row = []
+        for term, count in term_counts(tokenize(text), self.bigrams).items():
+            term_id = vocabulary.get(term)
+            if term_id is None:
+                term_id = vocabulary[term] = self._next_id
+                self._next_id += 1
+                counts[term_id] = count
+            else:
+                counts[term_id] += count
+            row.append((term_id, count))
+        row.sort()
+
+        self._line_numbers.extend((line_number,))
+        self._speaker_codes.extend((self.speakers.setdefault(speaker, len(self.speakers)),))
+        self._lengths.extend((len(row),))
+        if row:
+            row_ids, row_data = zip(*row)
+            self._indices.extend(row_ids)
+            self._data.extend(row_data)
+        self.rows += 1
+
+        if len(vocabulary) > self.max_vocab:
+            self.peak_vocab = max(self.peak_vocab, len(vocabulary))
+            self._prune()
+
+    def _prune(self):
+        target = self.max_vocab * 3 // 4
+        while len(self.vocabulary) > target:
+            self.prune_threshold += 1
+            for term, term_id in list(self.vocabulary.items()):
+                count = self.counts[term_id]
+                if count <= self.prune_threshold:
+                    del self.vocabulary[term]
+                    del self.counts[term_id]
+                    self.pruned_terms += 1
+                    self.pruned_occurrences += count
+        self.prunes += 1
+
+    def finish(self, min_count=1, max_features=None, lines=0, errors=(), source=None):
+        """
+        Fixes the vocabulary (the terms seen at least `min_count` times, at most the
+        `max_features` most frequent of them) and rewrites the spilled rows with the final
+        term ids, which keep the order of first appearance. Writes the per-sentence CSR
+        matrix, the per-speaker totals and `meta.json` (with `source`, the signature of the
+        corpus). Returns the metadata.
+        """
+        self.peak_vocab = max(self.peak_vocab, len(self.vocabulary))
+        for column in (self._line_numbers, self._speaker_codes, self._lengths, self._indices, self._data):
+            column.close()
+
+        kept = {term_id: count for term_id, count in self.counts.items() if count >= min_count}
+        if max_features is not None and len(kept) > max_features:
+            kept = dict(top_k(kept, max_features))
+        final_ids = {term_id: index for index, term_id in enumerate(sorted(kept))}
+        terms_by_id = {term_id: term for term, term_id in self.vocabulary.items() if term_id in final_ids}
+        # Only the final vocabulary is needed from here on
+        self.vocabulary = {}
+        self.counts = {}
+
+        # Provisional ids are sorted within a row and the final ids keep their order, so
+        # the rewritten rows stay sorted
+        indptr = _ColumnWriter(self._path("indptr.uint64"), "Q", 8)
+        indices = _ColumnWriter(self._path("indices.uint32"), "I", 4)
+        data = _ColumnWriter(self._path("data.uint32"), "I", 4)
+        # Per-speaker totals, spilled as a sorted run of (speaker code << 32 | final id,
+        # occurrences) whenever they hold more than max_vocab pairs
+        totals = [defaultdict(int) for _ in self.speakers]
+        total_pairs = 0
+        total_keys = _ColumnWriter(self._path("total_keys.tmp"), "Q", 8)
+        total_counts = _ColumnWriter(self._path("total_counts.tmp"), "Q", 8)
+        run_bounds = [0]
+
+        def spill_totals():
+            for code, speaker_totals in enumerate(totals):
+                if speaker_totals:
+                    row = sorted(speaker_totals.items())
+                    speaker_key = code << 32
+                    total_keys.extend(speaker_key | final_id for final_id, count in row)
+                    total_counts.extend(count for final_id, count in row)
+                    speaker_totals.clear()
+            run_bounds.append(run_bounds[-1] + total_pairs)
+
+        nonzero = 0
+        indptr.extend((0,))
+        with open(self._path("lengths.tmp"), "rb") as lengths_file, \
+                open(self._path("speakers.codes"), "rb") as codes_file, \
+                open(self._path("indices.tmp"), "rb") as indices_file, \
+                open(self._path("data.tmp"), "rb") as data_file:
+            # A block of rows at a time, with their entries remapped in one go
+            while True:
+                lengths = _read_items(lengths_file, "I", WRITE_BLOCK)
+                if not lengths:
+                    break
+                codes = _read_items(codes_file, "I", len(lengths))
+                entries = sum(lengths)
+                block_ids = list(map(final_ids.get, _read_items(indices_file, "Q", entries)))
+                block_data = _read_items(data_file, "I", entries)
+                block_indptr = []
+                position = 0
+                for length, code in zip(lengths, codes):
+                    row_ids = block_ids[position:position + length]
+                    row_data = block_data[position:position + length]
+                    position += length
+                    if None in row_ids:
+                        # Terms that did not make it into the vocabulary
+                        row = [(final_id, count) for final_id, count in zip(row_ids, row_data) if final_id is not None]
+                        row_ids = [final_id for final_id, count in row]
+                        row_data = [count for final_id, count in row]
+                    speaker_totals = totals[code]
+                    speaker_pairs = len(speaker_totals)
+                    for final_id, count in zip(row_ids, row_data):
+                        speaker_totals[final_id] += count
+                    total_pairs += len(speaker_totals) - speaker_pairs
+                    if total_pairs > self.max_vocab:
+                        spill_totals()
+                        total_pairs = 0
+                    indices.extend(row_ids)
+                    data.extend(row_data)
+                    nonzero += len(row_ids)
+                    block_indptr.append(nonzero)
+                indptr.extend(block_indptr)
+        if len(run_bounds) > 1:
+            # The totals outgrew memory before: the rest goes to disk as the last run
+            spill_totals()
+        for column in (indptr, indices, data, total_keys, total_counts):
+            column.close()
+        for file_name in ("lengths.tmp", "indices.tmp", "data.tmp"):
+            os.remove(self._path(file_name))
+
+        # Per-speaker totals as a second CSR matrix, one row per speaker code
+        speaker_indptr = _ColumnWriter(self._path("speaker_indptr.uint64"), "Q", 8)
+        speaker_indices = _ColumnWriter(self._path("speaker_indices.uint32"), "I", 4)
+        speaker_data = _ColumnWriter(self._path("speaker_data.uint64"), "Q", 8)
+        speaker_nonzero = 0
+        speaker_indptr.extend((0,))
+        # Rows of the speaker codes below this one are written
+        closed = 0
+        with open(self._path("total_keys.tmp"), "rb") as keys_file, \
+                open(self._path("total_counts.tmp"), "rb") as counts_file:
+            if len(run_bounds) == 1:
+                rows = ((code, sorted(speaker_totals.items()))
+                        for code, speaker_totals in enumerate(totals) if speaker_totals)
+            else:
+                # The merged runs come sorted by speaker code and then by final id
+                summed = _summed_runs(keys_file, counts_file, run_bounds)
+                rows = ((code, [(key & 0xFFFFFFFF, total) for key, total in row])
+                        for code, row in groupby(summed, key=lambda item: item[0] >> 32))
+            for code, row in rows:
+                # Speakers without any kept term have empty rows
+                speaker_indptr.extend((speaker_nonzero,) * (code - closed))
+                speaker_indices.extend(final_id for final_id, count in row)
+                speaker_data.extend(count for final_id, count in row)
+                speaker_nonzero += len(row)
+                speaker_indptr.extend((speaker_nonzero,))
+                closed = code + 1
+        speaker_indptr.extend((speaker_nonzero,) * (len(self.speakers) - closed))
+        for column in (speaker_indptr, speaker_indices, speaker_data):
+            column.close()
+        for file_name in ("total_keys.tmp", "total_counts.tmp"):
+            os.remove(self._path(file_name))
+
+        with open(self._path("vocabulary.json"), "w", encoding="utf-8") as vocabulary_file:
+            json.dump({
+                "terms": [terms_by_id[term_id] for term_id in final_ids],
+                "counts": [kept[term_id] for term_id in final_ids],
+            }, vocabulary_file, ensure_ascii=False)
+
+        meta = {
+            "version": FEATURES_VERSION,
+            "byteorder": sys.byteorder,
+            "rows": self.rows,
+            "lines": lines,
+            "nonzero": nonzero,
+            "terms": len(final_ids),
+            "source": source,
+            "bigrams": self.bigrams,
+            "max_vocab": self.max_vocab,
+            "min_count": min_count,
+            "max_features": max_features,
+            "pruning": {
+                "prunes": self.prunes,
+                "threshold": self.prune_threshold,
+                "terms": self.pruned_terms,
+                "occurrences": self.pruned_occurrences,
+                "peak_vocabulary": self.peak_vocab,
+            },
+            "speakers": list(self.speakers),
+            "errors": list(errors),
+        }
+        with open(self._path("meta.json"), "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False)
+        return meta
+
+def build_features(jsonl_path, store_dir, max_vocab=1_000_000, min_count=1, max_features=None, bigrams=True):
+    """
+    Scans a (possibly compressed) JSONL corpus once and writes a feature store with one
+    row per line that has a speaker_name and a sentence_text, labeled with the normalized
+    speaker name. Lines that are not valid JSON are left out and their errors are kept in
+    the metadata. Returns the metadata.
+    """
+    # Taken before the scan, so a missing corpus fails before the store directory is created
+    signature = source_signature(jsonl_path)
+    builder = FeatureBuilder(store_dir, max_vocab, bigrams)
+    errors = []
+    line_number = 0
+    for line_number, line in read_numbered_byte_lines(jsonl_path):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append((line_number, str(e)))
+            continue
+        if "speaker_name" in record and "sentence_text" in record:
+            speaker = top_speakers.cached_normalize_full_name(record["speaker_name"])
+            builder.add(line_number, speaker, str(record["sentence_text"]))
+    return builder.finish(min_count, max_features, line_number, errors, signature)
+
+class FeatureStore:
+    """
+    Read-only view of a store written by `build_features`.
+
+    The sentence rows are a CSR matrix: the term ids and counts of row `i` are
+    `indices[indptr[i]:indptr[i + 1]]` and `data[...]`, sorted by term id, with
+    `speaker_codes[i]` the index of its speaker in `speakers` and `line_numbers[i]` its
+    line in the corpus. `speaker_indptr`, `speaker_indices` and `speaker_data` hold the
+    per-speaker totals the same way. Every column is memory-mapped, as in `CorpusStore`.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta.get("version") != FEATURES_VERSION:
+            raise ValueError(f"Unsupported feature store version in {store_dir}")
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Feature store {store_dir} was built on a {self.meta['byteorder']}-endian machine")
+        with open(os.path.join(store_dir, "vocabulary.json"), "r", encoding="utf-8") as vocabulary_file:
+            vocabulary = json.load(vocabulary_file)
+
+        self.rows = self.meta["rows"]
+        self.terms = vocabulary["terms"]
+        self.term_counts = vocabulary["counts"]
+        self.speakers = self.meta["speakers"]
+        self.errors = [tuple(error) for error in self.meta["errors"]]
+        self._term_ids = None
+        self._maps = []
+        self.line_numbers = self._map_column("line_numbers.uint64", "Q")
+        self.speaker_codes = self._map_column("speakers.codes", "I")
+        self.indptr = self._map_column("indptr.uint64", "Q")
+        self.indices = self._map_column("indices.uint32", "I")
+        self.data = self._map_column("data.uint32", "I")
+        self.speaker_indptr = self._map_column("speaker_indptr.uint64", "Q")
+        self.speaker_indices = self._map_column("speaker_indices.uint32", "I")
+        self.speaker_data = self._map_column("speaker_data.uint64", "Q")
+        self._columns = [self.line_numbers, self.speaker_codes, self.indptr, self.indices, self.data,
+                         self.speaker_indptr, self.speaker_indices, self.speaker_data]
+
+    def _map_column(self, file_name, typecode):
+        with open(os.path.join(self.store_dir, file_name), "rb") as column_file:
+            if os.fstat(column_file.fileno()).st_size == 0:
+                # Empty files cannot be mapped
+                return memoryview(array(typecode))
+            mapped = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+    def close(self):
+        for column in self._columns:
+            column.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def term_id(self, term):
+        """
+        Id of a term ("word" or "word word"), or None if it is not in the vocabulary.
+        """
+        if self._term_ids is None:
+            self._term_ids = {term: term_id for term_id, term in enumerate(self.terms)}
+        return self._term_ids.get(term)
+
+    def row(self, row):
+        """
+        (term id, count) pairs of a sentence row.
+        """
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return list(zip(self.indices[start:end], self.data[start:end]))
+
+    def speaker_rows(self, speaker):
+        """
+        Rows of a normalized speaker name, in corpus order.
+        """
+        code = self.speakers.index(speaker)
+        return [row for row, row_code in enumerate(self.speaker_codes) if row_code == code]
+
+    def speaker_totals(self, speaker):
+        """
+        (term id, count) pairs summed over every sentence of a normalized speaker name.
+        """
+        code = self.speakers.index(speaker)
+        start, end = self.speaker_indptr[code], self.speaker_indptr[code + 1]
+        return list(zip(self.speaker_indices[start:end], self.speaker_data[start:end]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Tokenize every sentence once and save sparse unigram/bigram counts per sentence "
+                    "and per speaker as memory-mappable arrays."
+    )
+    parser.add_argument("store_dir", help="directory to write the feature store into")
+    parser.add_argument("--corpus", default=top_speakers.file_path, metavar="PATH", help="JSONL file to read")
+    parser.add_argument(
+        "--max-vocab", type=int, default=1_000_000, metavar="TERMS",
+        help="prune the rarest terms whenever the vocabulary grows past TERMS, which bounds the memory of the scan",
+    )
+    parser.add_argument("--min-count", type=int, default=2, metavar="N", help="keep only terms seen at least N times")
+    parser.add_argument("--max-features", type=int, default=None, metavar="N", help="keep only the N most frequent terms")
+    parser.add_argument("--unigrams", action="store_true", help="count single words only, without bigrams")
+    args = parser.parse_args(argv)
+    if args.max_vocab < 1 or args.min_count < 1 or (args.max_features is not None and args.max_features < 1):
+        parser.error("--max-vocab, --min-count and --max-features must be at least 1")
+
+    start = time.perf_counter()
+    try:
+        meta = build_features(args.corpus, args.store_dir, args.max_vocab, args.min_count, args.max_features,
+                              not args.unigrams)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.corpus}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    top_speakers.print_json_errors(meta["errors"])
+    pruning = meta["pruning"]
+    print(f"Stored {meta['rows']} sentences from {args.corpus} in {args.store_dir}")
+    print(f"Vocabulary: {meta['terms']} terms, {meta['nonzero']} nonzero counts, {len(meta['speakers'])} speakers")
+    print(f"Pruning: {pruning['prunes']} times (threshold {pruning['threshold']}), dropped {pruning['terms']} terms "
+          f"with {pruning['occurrences']} occurrences; largest vocabulary {pruning['peak_vocabulary']} terms")
+    rss = peak_rss_mb()
+    print(f"Time: {elapsed:.2f}s ({meta['rows'] / max(elapsed, 1e-9):,.0f} sentences/sec)"
+          + (f", peak memory: {rss:.0f} MB" if rss is not None else ""))
+
+if __name__ == "__main__":
+    main()
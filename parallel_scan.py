@@ -0,0 +1,113 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus_io import is_compressed, open_corpus
+
+# Chunks per worker; more chunks than workers keeps the pool busy when lines vary in length
+CHUNKS_PER_WORKER = 4
+
+def chunk_ranges(path, chunk_count, start=0, end=None):
+    """
+    Splits the byte range [start, end) of a file (the whole file by default) into at most
+    `chunk_count` ranges that start and end on line boundaries. `start` has to be the
+    start of a line.
+    """
+    if end is None:
+        end = os.path.getsize(path)
+    boundaries = [start]
+    with open(path, "rb") as file:
+        for index in range(1, chunk_count):
+            position = start + (end - start) * index // chunk_count
+            if position <= boundaries[-1]:
+                continue
+            # Move the boundary past the end of the line it falls into
+            file.seek(position - 1)
+            file.readline()
+            position = file.tell()
+            if boundaries[-1] < position < end:
+                boundaries.append(position)
+    boundaries.append(end)
+    return [(chunk_start, chunk_end) for chunk_start, chunk_end in zip(boundaries, boundaries[1:])
+            if chunk_start < chunk_end]
+
+def read_numbered_lines(path, start=0, end=None):
+    """
+    Yields (line_number, line) pairs for the lines in the byte range [start, end).
+    Line numbers start at 1 for the first line of the range. Compressed corpora are
+    decompressed on the fly and can only be read as a whole.
+    """
+    if is_compressed(path):
+        if start or end is not None:
+            raise ValueError(f"{path} is compressed and can only be read from the start")
+        with open_corpus(path) as file:
+            for line_number, line in enumerate(file, start=1):
+                yield line_number, line.decode("utf-8")
+        return
+    with open(path, "rb") as file:
+        file.seek(start)
+        position = start
+        for line_number, line in enumerate(file, start=1):
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            yield line_number, line.decode("utf-8")
+
+def _run_chunk(task):
+    function, reader, path, start, end, args = task
+    line_count = 0
+
+    def counted_lines():
+        nonlocal line_count
+        for line_number, line in reader(path, start, end):
+            line_count = line_number
+            yield line_number, line
+
+    result = function(counted_lines(), *args)
+    return line_count, result
+
+def map_chunks(function, path, workers=1, *args, start=0, end=None, reader=read_numbered_lines, on_lines=None):
+    """
+    Runs `function(numbered_lines, *args)` over newline-aligned chunks of a file, or of
+    its byte range [start, end). The numbered lines come from `reader(path, start, end)`,
+    by default decoded text lines. `on_lines`, if given, is called with the number of
+    lines read (e.g. `RunMetrics.stage_lines`).
+
+    With `workers` > 1 the chunks are processed in a process pool, so `function` has to
+    be a module-level function. A compressed file is read as one chunk. Returns a list of (line_offset, result) pairs in file
+    order, where line_offset is the number of lines between `start` and the chunk: a line
+    numbered `n` inside a chunk is line `line_offset + n` of the range.
+    """
+    if is_compressed(path):
+        # A compressed stream cannot be split by byte offsets
+        ranges = [(start, end)]
+    elif workers <= 1:
+        ranges = [(start, os.path.getsize(path) if end is None else end)]
+    else:
+        ranges = chunk_ranges(path, workers * CHUNKS_PER_WORKER, start, end)
+    tasks = [(function, reader, path, chunk_start, chunk_end, args) for chunk_start, chunk_end in ranges]
+
+    if workers <= 1 or len(tasks) <= 1:
+        outcomes = [_run_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(_run_chunk, tasks))
+
+    results = []
+    line_offset = 0
+    for line_count, result in outcomes:
+        results.append((line_offset, result))
+        line_offset += line_count
+    if on_lines is not None:
+        on_lines(line_offset)
+    return results
+
+def merge_counts(partial_counts):
+    """
+    Sums per-chunk counters in file order, so keys keep the order of their first appearance.
+    """
+    merged = defaultdict(int)
+    for counts in partial_counts:
+        for key, count in counts.items():
+            merged[key] += count
+    return merged
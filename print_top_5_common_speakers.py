@@ -1,3 +1,5 @@
+import argparse
+import heapq
 import json
 from collections import defaultdict
 import os
@@ -5,8 +7,21 @@ import re
 import random
 import sys
 
+from checkpoint import checkpoint_path, count_newlines, plan_resume, save_checkpoint
+from corpus_io import ShardedJsonlWriter, find_corpus, is_compressed, write_manifest
+from corpus_store import MISSING_CODE, CorpusStore
+from field_scanner import read_numbered_byte_lines
+from heavy_hitters import SpaceSaving, top_k
+from lexicon import departments, title_matcher, titles
+from line_index import index_path, load_or_build_line_index, read_sentences, sample_offsets
+from metrics import RunMetrics, profiled
+from name_cache import NormalizationCache, rules_fingerprint, sidecar_path
+from parallel_scan import map_chunks, merge_counts
+from sentence_arena import SentenceArena
+
 # Define the path to the file located in the same directory as the script
-file_path = os.path.join(os.path.dirname(__file__), "result.jsonl")
+# (result.jsonl.gz, .xz or .bz2 is read instead when there is no uncompressed copy)
+file_path = find_corpus(os.path.join(os.path.dirname(__file__), "result.jsonl"))
 
 # Original predefined pairs of shortened (nicknames) and lengthened (full) first names
 nickname_map = {
@@ -52,25 +67,30 @@ speaker_map = {
     # "מוטי כהן": "מרדכי כהן",
 }
 
-# Titles and departments to remove from names
-titles = [
-    '<<.*>>', 'תשובת', 'הד"ר', 'ד"ר', 'מ"מ היו"ר', 'היו"ר', 'יו"ר', 'נשיא הפרלמנט האירופי', 'שר', 'שרת',
-    'עו"ד', 'המשנה לראש הממשלה', 'משנה לראש הממשלה', 'ראש הממשלה', 'נצ"מ', 'מר', 'ניצב', 'טפסר משנה', 'רשף',
-    "פרופ'", 'סגן', 'סגנית', 'השר', 'השרה', 'מזכיר', 'מזכירת', 'ועדת'
-]
-departments = [
-    'הכנסת', 'הכלכלה', 'הכלכלה והתכנון', 'האנרגיה והמים', 'החינוך', 'החינוך והתרבות',
-    'התשתיות הלאומיות', 'התשתיות הלאומיות, האנרגיה והמים', 'חינוך', 'המודיעין', 'לשיתוף פעולה אזורי',
-    'ההסברה והתפוצות', 'האוצר', 'להגנת הסביבה', 'התעשייה, המסחר והתעסוקה', 'לאיכות הסביבה',
-    'התרבות והספורט', 'התשתיות', 'המשפטים', 'הרווחה', 'הרווחה והשירותים החברתיים', 'הבינוי והשיכון',
-    'התחבורה והבטיחות בדרכים', 'המשטרה', 'הבריאות', 'החקלאות ופיתוח הכפר', 'התקשורת',
-    'במשרד ראש הממשלה', 'הפנים', 'הביטחון', 'לביטחון פנים', 'המדע והטכנולוגיה', 'העלייה והקליטה',
-    'לקליטת העלייה', 'התיירות', 'החוץ', 'המדע,', 'למודיעין', 'לאזרחים ותיקים', 'לענייני דתות', 'לענייני מודיעין',
-    'המדע', 'התרבות', 'הספורט', 'תרבות', 'ספורט'
-]
-
-# Compile a regex pattern to match titles and departments
-bad_words_pattern = re.compile(rf"({'|'.join(map(re.escape, titles + departments))})", re.IGNORECASE)
+def load_speaker_map(path):
+    """
+    Loads the `speaker_map` of a file written by speaker_clusters.py, or returns an empty
+    dict if there is none.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)["speaker_map"]
+    except FileNotFoundError:
+        return {}
+
+# Reviewed mappings generated by speaker_clusters.py, if present (hand-written entries win)
+for variant, canonical in load_speaker_map(os.path.join(os.path.dirname(__file__), "speaker_map.json")).items():
+    speaker_map.setdefault(variant, canonical)
+
+def clean_full_name(full_name):
+    """
+    Removes titles, departments and extra spaces from a speaker name.
+    """
+    # Remove any titles or departments from the name
+    cleaned_name = title_matcher.strip(full_name).strip()
+
+    # Remove any extra spaces that might have been left after removal
+    return re.sub(r'\s+', ' ', cleaned_name)
 
 def normalize_full_name(full_name):
     """
@@ -80,11 +100,8 @@ def normalize_full_name(full_name):
     3. If not in speaker_map, mapping first names via nickname_map.
     4. Removing single-letter initials if they are not in nickname_map.
     """
-    # Remove any titles or departments from the name
-    cleaned_name = bad_words_pattern.sub("", full_name).strip()
-
-    # Remove any extra spaces that might have been left after removal
-    cleaned_name = re.sub(r'\s+', ' ', cleaned_name)
+    # Remove titles, departments and extra spaces
+    cleaned_name = clean_full_name(full_name)
 
     # First, check if the entire cleaned name is in speaker_map
     if cleaned_name in speaker_map:
@@ -106,15 +123,27 @@ def normalize_full_name(full_name):
             return f"{first_name} {last_name}"
     return cleaned_name  # Return as-is if it doesn't fit the expected structure
 
+# Resolve every distinct raw speaker name only once; the fingerprint invalidates saved
+# name tables whenever the titles, departments or name maps change
+cached_normalize_full_name = NormalizationCache(
+    normalize_full_name, rules_fingerprint(titles, departments, nickname_map, speaker_map)
+)
+
+# Stage timings and counters for --metrics-json (disabled unless requested)
+metrics = RunMetrics("top_speakers")
+
 def downsample_sentences_random(sentences, target_size):
     """
-    Downsamples a list of sentences to the target_size by removing sentences randomly.
-    Returns the downsampled list and the list of removed sentences.
+    Downsamples a list (or SentenceArena) of sentences to the target_size by removing
+    sentences randomly. Returns the downsampled sentences and the removed sentences.
     """
     if len(sentences) > target_size:
-        # Shuffle the sentences randomly
+        # Shuffle the sentences randomly (an arena only moves its offsets)
         shuffled = sentences.copy()
-        random.shuffle(shuffled)
+        if isinstance(shuffled, SentenceArena):
+            shuffled.shuffle()
+        else:
+            random.shuffle(shuffled)
         # Take the first target_size sentences
         downsampled = shuffled[:target_size]
         # The removed sentences are the rest
@@ -124,43 +153,574 @@ def downsample_sentences_random(sentences, target_size):
         # If already at or below target size, return as is with no removed sentences
         return sentences, []
 
-def calculate_statistics_random(removed_sentences):
+def calculate_statistics_random(removed_sentences, discarded_count=0):
     """
     Calculates statistics (count) of removed sentences.
     Since removal is random, we won't calculate lengths.
+    `discarded_count` adds sentences that were dropped without ever being stored
+    (by the single-pass reservoirs or the line-index sampling).
     """
     return {
-        "count": len(removed_sentences)
+        "count": len(removed_sentences) + discarded_count
     }
 
-def main():
-    # Optional: Set a random seed for reproducibility
-    # Uncomment the following line to have reproducible results
-    # random.seed(42)
+def push_bounded(heap, entry, capacity):
+    """
+    Pushes an entry onto a max-heap of negated priority keys and trims it to capacity.
+    Returns the evicted entry (the one with the highest key) or None.
+    """
+    if len(heap) < capacity:
+        heapq.heappush(heap, entry)
+        return None
+    return heapq.heappushpop(heap, entry)
+
+def print_json_errors(errors, line_offset=0):
+    """
+    Prints the JSON decoding errors collected by a pass, with file line numbers.
+    """
+    for line_number, message in errors:
+        print(f"JSON decoding error on line {line_offset + line_number}: {message}")
 
-    # Initialize a dictionary to uniquely identify speakers
+def count_speakers(lines, capacity=None):
+    """
+    First pass: counts the sentences of every normalized speaker name.
+    Takes (line_number, line) pairs with the lines as bytes and returns the counter and
+    the JSON decoding errors. With a `capacity`, the counter is a Space-Saving summary
+    that tracks at most that many names.
+    """
+    unique_speaker_counter = defaultdict(int) if capacity is None else SpaceSaving(capacity)
+    errors = []
+    for line_number, line in lines:
+        try:
+            # Parse each line as JSON
+            record = json.loads(line)
+            if "speaker_name" in record:
+                speaker_name = record["speaker_name"]
+
+                # Normalize the speaker's full name
+                normalized_name = cached_normalize_full_name(speaker_name)
+
+                # Increment the count for the normalized name
+                if capacity is None:
+                    unique_speaker_counter[normalized_name] += 1
+                else:
+                    unique_speaker_counter.add(normalized_name)
+        except json.JSONDecodeError as e:
+            errors.append((line_number, str(e)))
+            continue  # Skip lines with JSON errors
+    return unique_speaker_counter, errors
+
+def collect_sentences(lines, top_2_speakers):
+    """
+    Second pass: collects the sentences of the top 2 speakers and of everybody else.
+    Takes (line_number, line) pairs and also returns the JSON decoding errors.
+    """
+    # Initialize arenas to hold sentences for the top 2 speakers
+    top_2_sentences = {speaker: SentenceArena() for speaker in top_2_speakers}
+
+    # Initialize an arena to hold sentences not belonging to top 2 speakers
+    none_top_2_speakers_sentences = SentenceArena()
+
+    errors = []
+    for line_number, line in lines:
+        try:
+            # Parse each line as JSON
+            record = json.loads(line)
+            if "speaker_name" in record and "sentence_text" in record:
+                speaker_name = record["speaker_name"]
+                sentence_text = record["sentence_text"]
+
+                # Normalize the speaker's full name
+                normalized_name = cached_normalize_full_name(speaker_name)
+
+                # If the speaker is in the top 2, add the sentence to the corresponding list
+                if normalized_name in top_2_speakers:
+                    top_2_sentences[normalized_name].append(sentence_text)
+                else:
+                    none_top_2_speakers_sentences.append(sentence_text)
+        except json.JSONDecodeError as e:
+            errors.append((line_number, str(e)))
+            continue  # Skip lines with JSON errors
+    return top_2_sentences, none_top_2_speakers_sentences, errors
+
+def count_speakers_chunk(lines, capacity=None):
+    """
+    Worker side of the parallel first pass. Also hands back the names the worker
+    resolved and its cache counters, so the parent can save a complete name table,
+    together with the id of the process that ran the chunk.
+    """
+    hits, misses = cached_normalize_full_name.hits, cached_normalize_full_name.misses
+    unique_speaker_counter, errors = count_speakers(lines, capacity)
+    cache_delta = (
+        os.getpid(),
+        list(cached_normalize_full_name.table.items()),
+        cached_normalize_full_name.hits - hits,
+        cached_normalize_full_name.misses - misses,
+    )
+    return unique_speaker_counter, errors, cache_delta
+
+def run_first_pass(path, workers=1, start=0, end=None, line_offset=0, capacity=None):
+    """
+    Counts speakers serially or, with `workers` > 1, over newline-aligned chunks of the
+    file in a process pool. The merged counter keeps the serial insertion order (so ties
+    in the ranking break the same way). `start`/`end` limit the pass to a byte range whose
+    first line is line `line_offset + 1` of the file. With a `capacity`, counts go into
+    Space-Saving summaries of that size (merged per chunk). Returns the counter and the
+    JSON decoding errors with file line numbers.
+    """
+    errors = []
+    if workers <= 1:
+        chunks = map_chunks(count_speakers, path, 1, capacity, start=start, end=end,
+                            reader=read_numbered_byte_lines, on_lines=metrics.stage_lines)
+        for chunk_offset, (counts, chunk_errors) in chunks:
+            errors.extend((line_offset + chunk_offset + line_number, message) for line_number, message in chunk_errors)
+        return chunks[0][1][0], errors
+
+    chunks = map_chunks(count_speakers_chunk, path, workers, capacity, start=start, end=end,
+                        reader=read_numbered_byte_lines, on_lines=metrics.stage_lines)
+    for chunk_offset, (counts, chunk_errors, (worker_pid, *cache_delta)) in chunks:
+        errors.extend((line_offset + chunk_offset + line_number, message) for line_number, message in chunk_errors)
+        # map_chunks runs a single chunk (e.g. a compressed file) in this process, whose
+        # cache already holds its names and counted its lookups
+        if worker_pid != os.getpid():
+            cached_normalize_full_name.merge(*cache_delta)
+    partial_counts = [counts for chunk_offset, (counts, chunk_errors, cache_delta) in chunks]
+    if capacity is not None:
+        return SpaceSaving.merged(partial_counts, capacity), errors
+    return merge_counts(partial_counts), errors
+
+def run_checkpointed_first_pass(path, checkpoint_file, workers=1):
+    """
+    First pass that only parses what was appended since the last run. The counter and
+    errors of the already processed prefix come from the checkpoint, which is replaced by
+    one covering every complete line of the file. If the file was rewritten instead of
+    appended to, the checkpoint is ignored and the whole file is counted again.
+    """
+    fingerprint = "top_speakers:" + cached_normalize_full_name.fingerprint
+    saved, start, line_offset, end = plan_resume(checkpoint_file, path, fingerprint)
+    if saved is not None:
+        print(f"Resuming from checkpoint at line {line_offset}")
+        partial_counts = [saved["state"]["counts"]]
+        errors = [tuple(error) for error in saved["state"]["errors"]]
+    else:
+        partial_counts = []
+        errors = []
+
+    counts, new_errors = run_first_pass(path, workers, start, end, line_offset)
+    partial_counts.append(counts)
+    errors.extend(new_errors)
+    lines = line_offset + count_newlines(path, start, end)
+    unique_speaker_counter = merge_counts(partial_counts)
+    save_checkpoint(checkpoint_file, path, fingerprint, end, lines,
+                    {"counts": unique_speaker_counter, "errors": errors})
+
+    # A last line without a newline may still be growing: count it, but not in the checkpoint
+    tail_counts, tail_errors = run_first_pass(path, 1, end, None, lines)
+    return merge_counts([unique_speaker_counter, tail_counts]), errors + tail_errors
+
+def run_second_pass(path, top_2_speakers, workers=1):
+    """
+    Collects the sentences serially or chunk by chunk in a process pool; the chunk
+    arenas are concatenated in file order, so the result matches the serial pass.
+    The JSON decoding errors are printed and added to the `json_errors` counter.
+    """
+    chunks = map_chunks(collect_sentences, path, workers, top_2_speakers, on_lines=metrics.stage_lines)
+    if len(chunks) == 1:
+        # A single chunk's arenas are the result, without copying their buffers
+        line_offset, (top_2_sentences, none_top_2_speakers_sentences, errors) = chunks[0]
+        print_json_errors(errors, line_offset)
+        metrics.add("json_errors", len(errors))
+        return top_2_sentences, none_top_2_speakers_sentences
+    top_2_sentences = {speaker: SentenceArena() for speaker in top_2_speakers}
+    none_top_2_speakers_sentences = SentenceArena()
+    for line_offset, (chunk_top_2, chunk_others, errors) in chunks:
+        print_json_errors(errors, line_offset)
+        metrics.add("json_errors", len(errors))
+        for speaker in top_2_speakers:
+            top_2_sentences[speaker].extend(chunk_top_2[speaker])
+        none_top_2_speakers_sentences.extend(chunk_others)
+    return top_2_sentences, none_top_2_speakers_sentences
+
+def count_speakers_from_store(store):
+    """
+    First pass over a columnar corpus store: a bincount of the speaker codes, then one
+    normalization per distinct raw name. Returns the counter and the JSON decoding errors
+    recorded when the store was built.
+    """
     unique_speaker_counter = defaultdict(int)
+    raw_names = store.dictionaries["speaker_name"]
+    # Codes follow the order of first appearance, so the counter keeps the serial order
+    for code, count in store.code_counts("speaker_name"):
+        unique_speaker_counter[cached_normalize_full_name(raw_names[code])] += count
+    return unique_speaker_counter, list(store.errors)
+
+def collect_sentences_from_store(store, top_2_speakers):
+    """
+    Second pass over a columnar corpus store; sentences are copied out of the UTF-8 blob
+    into the arenas without being decoded.
+    """
+    top_2_sentences = {speaker: SentenceArena() for speaker in top_2_speakers}
+    none_top_2_speakers_sentences = SentenceArena()
+
+    # Resolve the destination arena once per distinct raw name
+    destinations = []
+    for raw_name in store.dictionaries["speaker_name"]:
+        normalized_name = cached_normalize_full_name(raw_name)
+        destinations.append(top_2_sentences.get(normalized_name, none_top_2_speakers_sentences))
+
+    speaker_codes = store.codes["speaker_name"]
+    present = store.sentence_present
+    offsets = store.sentence_offsets
+    blob = store.sentence_blob
+    for row in range(store.rows):
+        code = speaker_codes[row]
+        if code != MISSING_CODE and present[row]:
+            destinations[code].append_encoded(blob[offsets[row]:offsets[row + 1]])
+    return top_2_sentences, none_top_2_speakers_sentences, list(store.errors)
+
+def single_pass_collect(lines, candidate_count=5, headroom=2, min_capacity=10000):
+    """
+    Counts speakers and keeps a bounded random sample of their sentences in one read.
+
+    Every sentence gets a random priority key, and the lowest keys of any group of
+    sentences are a uniform random sample of that group. The `candidate_count` currently
+    most frequent speakers keep their own reservoir, all other speakers share one pool.
+    Reservoirs and pool keep the lowest keys up to `headroom` times the running count of
+    the second speaker (at least `min_capacity`), so memory follows the target size
+    instead of the corpus size.
+
+    The second speaker needs every one of its sentences, so the current top 2 are never
+    demoted to the pool, and a promoted speaker takes its pooled sentences along into
+    its reservoir. Only a speaker that reaches the top 2 after some of its sentences were
+    dropped from the pool makes the sample fall back to a second pass.
+
+    Takes (line_number, line) pairs and returns the speaker counter, the reservoir state
+    for `reservoir_sample` and the JSON decoding errors.
+    """
+    unique_speaker_counter = defaultdict(int)
+    sentence_counts = defaultdict(int)
+    reservoirs = {}    # candidate speaker -> heap of (-key, sentence)
+    pool = []          # heap of (-key, speaker, sentence) for everybody else
+    pooled = defaultdict(int)  # speaker -> number of its sentences in the pool
+    min_evicted = {}   # speaker -> lowest key dropped from its reservoir or the pool
+    leader, lead_count, runner, runner_count = None, 0, None, 0
+    floor_count = 0    # lower bound on the smallest candidate count
+    errors = []
+
+    for line_number, line in lines:
+        try:
+            # Parse each line as JSON
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append((line_number, str(e)))
+            continue  # Skip lines with JSON errors
+        if "speaker_name" not in record:
+            continue
+
+        normalized_name = cached_normalize_full_name(record["speaker_name"])
+        unique_speaker_counter[normalized_name] += 1
+        count = unique_speaker_counter[normalized_name]
+
+        # Track the two most frequent speakers and their running counts
+        if normalized_name == leader:
+            lead_count = count
+        elif count > lead_count:
+            leader, lead_count, runner, runner_count = normalized_name, count, leader, lead_count
+        elif count > runner_count or normalized_name == runner:
+            runner, runner_count = normalized_name, count
+        capacity = max(min_capacity, headroom * runner_count)
+
+        # Promote the speaker to a reservoir of its own once it overtakes a candidate
+        # (never one of the current top 2, which keep their reservoirs)
+        promoted = False
+        if normalized_name not in reservoirs:
+            if len(reservoirs) < candidate_count:
+                promoted = True
+            elif count > floor_count:
+                weakest = min((s for s in reservoirs if s != leader and s != runner),
+                              key=unique_speaker_counter.__getitem__)
+                if count > unique_speaker_counter[weakest]:
+                    # The demoted candidate's sentences move to the shared pool
+                    for neg_key, sentence in reservoirs.pop(weakest):
+                        pooled[weakest] += 1
+                        evicted = push_bounded(pool, (neg_key, weakest, sentence), capacity)
+                        if evicted is not None:
+                            pooled[evicted[1]] -= 1
+                            min_evicted[evicted[1]] = min(-evicted[0], min_evicted.get(evicted[1], 1.0))
+                    promoted = True
+                floor_count = min(unique_speaker_counter[s] for s in reservoirs)
+        if promoted:
+            reservoirs[normalized_name] = []
+            # Its sentences still in the pool move along
+            if pooled.pop(normalized_name, 0):
+                reservoirs[normalized_name] = [(neg_key, sentence) for neg_key, speaker, sentence in pool
+                                               if speaker == normalized_name]
+                heapq.heapify(reservoirs[normalized_name])
+                pool[:] = [entry for entry in pool if entry[1] != normalized_name]
+                heapq.heapify(pool)
+
+        if "sentence_text" not in record:
+            continue
+        sentence_counts[normalized_name] += 1
+        key = random.random()
+        if normalized_name in reservoirs:
+            evicted = push_bounded(reservoirs[normalized_name], (-key, record["sentence_text"]), capacity)
+            evicted_speaker = normalized_name
+        else:
+            pooled[normalized_name] += 1
+            evicted = push_bounded(pool, (-key, normalized_name, record["sentence_text"]), capacity)
+            evicted_speaker = evicted[1] if evicted is not None else None
+            if evicted is not None:
+                pooled[evicted_speaker] -= 1
+        if evicted is not None:
+            min_evicted[evicted_speaker] = min(-evicted[0], min_evicted.get(evicted_speaker, 1.0))
+
+    # Group the retained sentences by speaker with their (positive) keys
+    retained = defaultdict(list)
+    for speaker, heap in reservoirs.items():
+        retained[speaker].extend((-neg_key, sentence) for neg_key, sentence in heap)
+    for neg_key, speaker, sentence in pool:
+        retained[speaker].append((-neg_key, sentence))
+
+    reservoir_state = {
+        "sentence_counts": sentence_counts,
+        "retained": retained,
+        "min_evicted": min_evicted,
+    }
+    return unique_speaker_counter, reservoir_state, errors
+
+def reservoir_sample(reservoir_state, top_2_speakers):
+    """
+    Takes the balanced sets for the top 2 speakers out of the single-pass reservoirs.
 
-    print("Starting first pass to count sentences per speaker...")
+    The second speaker keeps all of its sentences; the first speaker and the 'other
+    sentences' keep the sentences with the lowest keys, which is a uniform random sample
+    of the same size the two-pass path would draw. Returns the sentence lists and the
+    original group sizes, or None if the reservoirs dropped a sentence that the sample
+    needs (then the caller has to collect the sentences with a second pass).
+    """
+    sentence_counts = reservoir_state["sentence_counts"]
+    retained = reservoir_state["retained"]
+    min_evicted = reservoir_state["min_evicted"]
+    top_1_speaker, top_2_speaker = top_2_speakers
+    target_size = sentence_counts[top_2_speaker]
+
+    # Split the retained sentences into the three groups
+    others = []
+    others_floor = 1.0
+    for speaker, entries in retained.items():
+        if speaker not in top_2_speakers:
+            others.extend(entries)
+    for speaker, key in min_evicted.items():
+        if speaker not in top_2_speakers:
+            others_floor = min(others_floor, key)
+    groups = {
+        top_1_speaker: (retained[top_1_speaker], sentence_counts[top_1_speaker], min_evicted.get(top_1_speaker, 1.0)),
+        top_2_speaker: (retained[top_2_speaker], target_size, min_evicted.get(top_2_speaker, 1.0)),
+        None: (others, sum(sentence_counts.values()) - sentence_counts[top_1_speaker] - target_size, others_floor),
+    }
+
+    samples = {}
+    original_sizes = {}
+    for group, (entries, total, floor) in groups.items():
+        needed = min(total, target_size)
+        entries.sort()
+        # Every sentence below the lowest dropped key is still retained
+        if len(entries) < needed or (needed and entries[needed - 1][0] >= floor):
+            return None
+        samples[group] = [sentence for key, sentence in entries[:needed]]
+        original_sizes[group] = total
+
+    top_2_sentences = {speaker: samples[speaker] for speaker in top_2_speakers}
+    return top_2_sentences, samples[None], original_sizes
+
+def line_index_sample(index, top_2_speakers):
+    """
+    Takes the balanced sets for the top 2 speakers from a line-offset index: offsets are
+    sampled per group and only the chosen lines are read back from the corpus. Returns
+    the sentence lists and the original group sizes, like `reservoir_sample`.
+    """
+    top_1_speaker, top_2_speaker = top_2_speakers
+    target_size = index.sentence_counts[top_2_speaker]
+    other_groups = [offsets for speaker, offsets in index.offsets.items() if speaker not in top_2_speakers]
+
+    top_1_offsets, _ = sample_offsets([index.offsets[top_1_speaker]], target_size)
+    other_offsets, _ = sample_offsets(other_groups, target_size)
+    top_2_sentences = {
+        top_1_speaker: read_sentences(file_path, top_1_offsets),
+        top_2_speaker: read_sentences(file_path, index.offsets[top_2_speaker]),
+    }
+    original_sizes = {
+        top_1_speaker: index.sentence_counts[top_1_speaker],
+        None: sum(len(offsets) for offsets in other_groups),
+    }
+    return top_2_sentences, read_sentences(file_path, other_offsets), original_sizes
+
+def write_balanced_dataset(output_dir, top_2_speakers, top_2_sentences, other_sentences,
+                           shard_records=100_000, compression=None):
+    """
+    Saves the balanced sets as sharded JSONL, one shard series per group ("top_1",
+    "top_2", "other"), with a `manifest.json` of the shards and their record counts.
+    Returns the path of the manifest.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    groups = {}
+    sets = [("top_1", top_2_speakers[0], top_2_sentences[top_2_speakers[0]]),
+            ("top_2", top_2_speakers[1], top_2_sentences[top_2_speakers[1]]),
+            ("other", None, other_sentences)]
+    for group, speaker, sentences in sets:
+        with ShardedJsonlWriter(output_dir, group, shard_records, compression) as writer:
+            for sentence_text in sentences:
+                writer.write({"speaker": speaker, "sentence_text": sentence_text})
+        groups[group] = ({"speaker": speaker}, writer.shards)
+    return write_manifest(output_dir, groups, source=os.path.abspath(file_path), compression=compression)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Find the top speakers and balance their sentence counts.")
+    parser.add_argument(
+        "--single-pass", action="store_true",
+        help="read the corpus once, keeping bounded per-speaker reservoirs instead of every sentence",
+    )
+    parser.add_argument(
+        "--name-table", nargs="?", const=sidecar_path(file_path), default=None, metavar="PATH",
+        help="load the resolved speaker-name table from PATH (default: next to the corpus) "
+             "if it matches the current rules, and save it after the run",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="parse, normalize and count newline-aligned chunks of the corpus in N processes",
+    )
+    parser.add_argument(
+        "--store", metavar="DIR",
+        help="read a columnar corpus store built by corpus_store.py instead of parsing the JSONL file",
+    )
+    parser.add_argument(
+        "--line-index", nargs="?", const=index_path(file_path), default=None, metavar="PATH",
+        help="sample from a sidecar index of line offsets per speaker (default: next to the corpus, "
+             "rebuilt when out of date) and read back only the chosen sentences",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None,
+        help="seed the random downsampling, so repeated runs draw the same sentences "
+             "(see stratified_sample.py for samples that do not depend on read order)",
+    )
+    parser.add_argument("--top", type=int, default=5, metavar="K", help="number of top speakers to report (at least 2)")
+    parser.add_argument(
+        "--heavy-hitters", type=int, default=None, metavar="CAPACITY",
+        help="count speakers in a Space-Saving summary of at most CAPACITY names instead of an exact "
+             "counter; reported counts come with their error bounds",
+    )
+    parser.add_argument(
+        "--output-dir", metavar="DIR",
+        help="save the downsampled top 2 and 'other' sets to DIR as sharded JSONL with a manifest.json",
+    )
+    parser.add_argument(
+        "--shard-records", type=int, default=100_000, metavar="N", help="records per output shard",
+    )
+    parser.add_argument(
+        "--compress", choices=["gz", "xz", "bz2"], default=None, help="compress the output shards",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH",
+        help="write stage timings, lines/sec, error counts, cache hit rate and peak memory to PATH ('-' for stdout)",
+    )
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="run under cProfile and save the stats to PATH (view with: python -m pstats PATH)",
+    )
+    parser.add_argument(
+        "--checkpoint", nargs="?", const=checkpoint_path(file_path, "top_speakers"), default=None, metavar="PATH",
+        help="save the speaker counts to PATH (default: next to the corpus) and on later runs count only "
+             "the lines appended since then",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.single_pass and args.workers > 1:
+        parser.error("--single-pass reads the corpus sequentially and cannot be combined with --workers")
+    if args.store and (args.single_pass or args.workers > 1):
+        parser.error("--store reads the prebuilt columns and cannot be combined with --single-pass or --workers")
+    if args.line_index and (args.store or args.single_pass or args.workers > 1):
+        parser.error("--line-index cannot be combined with --store, --single-pass or --workers")
+    if args.checkpoint and (args.store or args.single_pass or args.line_index):
+        parser.error("--checkpoint cannot be combined with --store, --single-pass or --line-index")
+    if is_compressed(file_path) and (args.line_index or args.checkpoint):
+        parser.error(f"--line-index and --checkpoint need random access and cannot read the compressed {file_path}")
+    if args.shard_records < 1:
+        parser.error("--shard-records must be at least 1")
+    if args.top < 2:
+        parser.error("--top must be at least 2")
+    if args.heavy_hitters is not None:
+        if args.heavy_hitters < args.top:
+            parser.error("--heavy-hitters CAPACITY must be at least --top")
+        if args.store or args.single_pass or args.line_index or args.checkpoint:
+            parser.error("--heavy-hitters cannot be combined with --store, --single-pass, --line-index or --checkpoint")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics_json is not None:
+        metrics.enable()
+        # Time spent resolving new names (title matching and regex clean-up) in this process
+        cached_normalize_full_name.normalize = metrics.timed("normalize", cached_normalize_full_name.normalize)
+    try:
+        with profiled(args.profile):
+            run_analysis(args)
+    finally:
+        metrics.set("name_cache", cached_normalize_full_name.stats())
+        metrics.write(args.metrics_json)
+
+def run_analysis(args):
+    # Optional: Set a random seed for reproducibility (--seed)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.name_table is not None:
+        if cached_normalize_full_name.load(args.name_table):
+            print(f"Loaded speaker name table from {args.name_table}")
+        else:
+            print(f"No up-to-date speaker name table at {args.name_table}, names will be resolved from scratch")
+
+    store = None
+    if args.store:
+        try:
+            store = CorpusStore(args.store)
+        except FileNotFoundError:
+            print(f"Error: Corpus store not found at {args.store}")
+            sys.exit(1)
+        if store.is_stale():
+            print(f"Warning: {store.meta['source']['path']} changed after the corpus store was built")
+
+    line_index = None
+    reservoir_state = None
+    metrics.lap("first_pass")
+    if args.single_pass:
+        print("Starting single pass to count speakers and fill the reservoirs...")
+    else:
+        print("Starting first pass to count sentences per speaker...")
 
     # First Pass: Read and count speakers
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            for line_number, line in enumerate(file, start=1):
-                try:
-                    # Parse each line as JSON
-                    record = json.loads(line)
-                    if "speaker_name" in record:
-                        speaker_name = record["speaker_name"]
-
-                        # Normalize the speaker's full name
-                        normalized_name = normalize_full_name(speaker_name)
-
-                        # Increment the count for the normalized name
-                        unique_speaker_counter[normalized_name] += 1
-                except json.JSONDecodeError as e:
-                    print(f"JSON decoding error on line {line_number}: {e}")
-                    continue  # Skip lines with JSON errors
+        if store is not None:
+            unique_speaker_counter, errors = count_speakers_from_store(store)
+        elif args.line_index:
+            line_index, rebuilt = load_or_build_line_index(
+                file_path, cached_normalize_full_name, args.line_index, cached_normalize_full_name.fingerprint
+            )
+            if rebuilt:
+                print(f"Built line index at {args.line_index}")
+            unique_speaker_counter = defaultdict(int, line_index.speaker_counts)
+            errors = line_index.errors
+        elif args.single_pass:
+            [(line_offset, (unique_speaker_counter, reservoir_state, errors))] = map_chunks(
+                single_pass_collect, file_path, on_lines=metrics.stage_lines
+            )
+        elif args.checkpoint:
+            unique_speaker_counter, errors = run_checkpointed_first_pass(file_path, args.checkpoint, args.workers)
+        else:
+            unique_speaker_counter, errors = run_first_pass(file_path, args.workers, capacity=args.heavy_hitters)
+        print_json_errors(errors)
+        metrics.set("json_errors", len(errors))
     except FileNotFoundError:
         print(f"Error: File not found at {file_path}")
         sys.exit(1)
@@ -168,8 +728,20 @@ def main():
         print(f"An unexpected error occurred during the first pass: {e}")
         sys.exit(1)
 
-    # Get the top 5 most common unique speakers
-    top_speakers = sorted(unique_speaker_counter.items(), key=lambda x: x[1], reverse=True)[:5]
+    if args.name_table is not None:
+        cache_stats = cached_normalize_full_name.stats()
+        print(f"Name normalization cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['size']} distinct names")
+        cached_normalize_full_name.save(args.name_table)
+
+    # Get the top K most common unique speakers (and the error bounds of approximate counts)
+    top_speakers = top_k(unique_speaker_counter, args.top)
+    count_errors = {}
+    if args.heavy_hitters is not None:
+        ranked, top_guaranteed = unique_speaker_counter.top(args.top)
+        count_errors = {speaker: error for speaker, count, error in ranked}
+        metrics.set("heavy_hitters", {"capacity": args.heavy_hitters, "tracked": len(unique_speaker_counter),
+                                      "evictions": unique_speaker_counter.evictions})
 
     # Check if there are at least two speakers
     if len(top_speakers) < 2:
@@ -181,42 +753,46 @@ def main():
 
     print(f"Top 2 speakers identified: {top_2_speakers[0]} and {top_2_speakers[1]}")
 
-    # Initialize lists to hold sentences for the top 2 speakers
-    top_2_sentences = {speaker: [] for speaker in top_2_speakers}
-
-    # Initialize list to hold sentences not belonging to top 2 speakers
-    none_top_2_speakers_sentences = []
-
-    print("Starting second pass to collect sentences...")
-
-    # Second Pass: Collect sentences for the top 2 speakers and others
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            for line_number, line in enumerate(file, start=1):
-                try:
-                    # Parse each line as JSON
-                    record = json.loads(line)
-                    if "speaker_name" in record and "sentence_text" in record:
-                        speaker_name = record["speaker_name"]
-                        sentence_text = record["sentence_text"]
-
-                        # Normalize the speaker's full name
-                        normalized_name = normalize_full_name(speaker_name)
-
-                        # If the speaker is in the top 2, add the sentence to the corresponding list
-                        if normalized_name in top_2_speakers:
-                            top_2_sentences[normalized_name].append(sentence_text)
-                        else:
-                            none_top_2_speakers_sentences.append(sentence_text)
-                except json.JSONDecodeError as e:
-                    print(f"JSON decoding error on line {line_number}: {e}")
-                    continue  # Skip lines with JSON errors
-    except FileNotFoundError:
-        print(f"Error: File not found at {file_path}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"An unexpected error occurred during the second pass: {e}")
-        sys.exit(1)
+    metrics.lap("second_pass")
+    sample = None
+    if reservoir_state is not None:
+        sample = reservoir_sample(reservoir_state, top_2_speakers)
+    elif line_index is not None:
+        print("Reading the sampled sentences through the line index...")
+        try:
+            sample = line_index_sample(line_index, top_2_speakers)
+        except Exception as e:
+            print(f"An unexpected error occurred while reading the sampled sentences: {e}")
+            sys.exit(1)
+    if sample is not None:
+        top_2_sentences, none_top_2_speakers_sentences, original_sizes = sample
+    else:
+        if reservoir_state is not None:
+            print("The reservoirs dropped sentences the sample needs, falling back to a second pass...")
+        print("Starting second pass to collect sentences...")
+
+        # Second Pass: Collect sentences for the top 2 speakers and others
+        try:
+            if store is not None:
+                top_2_sentences, none_top_2_speakers_sentences, errors = collect_sentences_from_store(
+                    store, top_2_speakers
+                )
+                print_json_errors(errors)
+                metrics.add("json_errors", len(errors))
+            else:
+                top_2_sentences, none_top_2_speakers_sentences = run_second_pass(
+                    file_path, top_2_speakers, args.workers
+                )
+        except FileNotFoundError:
+            print(f"Error: File not found at {file_path}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"An unexpected error occurred during the second pass: {e}")
+            sys.exit(1)
+        original_sizes = {top_2_speakers[0]: len(top_2_sentences[top_2_speakers[0]]),
+                          None: len(none_top_2_speakers_sentences)}
+
+    metrics.lap("downsample")
 
     # Determine the target size based on the second speaker's sentence count
     target_size = len(top_2_sentences[top_2_speakers[1]])
@@ -230,7 +806,7 @@ def main():
 
     # Downsample the first top speaker's sentences
     top_1_speaker = top_2_speakers[0]
-    original_size_top1 = len(top_2_sentences[top_1_speaker])
+    original_size_top1 = original_sizes[top_1_speaker]
     print(f"Original number of sentences for '{top_1_speaker}': {original_size_top1}")
     if original_size_top1 > target_size:
         downsampled_sentences_top1, removed_sentences_top1 = downsample_sentences_random(
@@ -243,7 +819,7 @@ def main():
         print(f"No downsampling needed for '{top_1_speaker}'")
 
     # Downsample the 'other sentences' list
-    original_size_others = len(none_top_2_speakers_sentences)
+    original_size_others = original_sizes[None]
     print(f"Original number of 'other sentences': {original_size_others}")
     if original_size_others > target_size:
         downsampled_others, removed_sentences_others = downsample_sentences_random(
@@ -255,15 +831,48 @@ def main():
         removed_sentences_others = []
         print("No downsampling needed for 'other sentences'")
 
-    # Calculate statistics for removed sentences
-    stats_top1 = calculate_statistics_random(removed_sentences_top1)
-    stats_others = calculate_statistics_random(removed_sentences_others)
+    # Calculate statistics for removed sentences (the reservoirs may have dropped some already)
+    stats_top1 = calculate_statistics_random(
+        removed_sentences_top1,
+        original_size_top1 - len(top_2_sentences[top_1_speaker]) - len(removed_sentences_top1),
+    )
+    stats_others = calculate_statistics_random(
+        removed_sentences_others,
+        original_size_others - len(none_top_2_speakers_sentences) - len(removed_sentences_others),
+    )
+
+    if args.output_dir is not None:
+        metrics.lap("write")
+        manifest_path = write_balanced_dataset(
+            args.output_dir, top_2_speakers, top_2_sentences, none_top_2_speakers_sentences,
+            args.shard_records, args.compress,
+        )
+        print(f"Saved the balanced dataset, see {manifest_path}")
+
+    metrics.lap("report")
 
-    # Print the top 5 unique speakers and the size of the top 2 sentence lists
+    # Print the top K unique speakers and the size of the top 2 sentence lists
     print("\n=== Summary ===")
-    print("Top 5 speakers with most sentences:")
+    print(f"Top {args.top} speakers with most sentences:")
     for normalized_name, count in top_speakers:
-        print(f"{normalized_name}: {count}")
+        if count_errors.get(normalized_name):
+            print(f"{normalized_name}: {count} (at least {count - count_errors[normalized_name]})")
+        else:
+            print(f"{normalized_name}: {count}")
+    if args.heavy_hitters is not None:
+        print(f"Heavy hitters: {len(unique_speaker_counter)} of at most {args.heavy_hitters} names tracked, "
+              f"{unique_speaker_counter.evictions} replaced; any untracked name has at most "
+              f"{unique_speaker_counter.minimum()} sentences")
+        # Each speaker's lower bound has to reach the next one's count for the order to hold
+        lower_bounds = [count - count_errors[speaker] for speaker, count in top_speakers]
+        ordered = all(lower >= count for lower, (speaker, count) in zip(lower_bounds, top_speakers[1:]))
+        counts_note = "the counts are upper bounds" if any(count_errors.values()) else "the counts are exact"
+        if top_guaranteed and ordered:
+            print(f"The top {args.top} ranking (membership and order) is guaranteed; {counts_note}")
+        elif top_guaranteed:
+            print(f"The top {args.top} speakers are guaranteed but their order is not; {counts_note}")
+        else:
+            print(f"The top {args.top} speakers are not guaranteed, use a larger --heavy-hitters capacity")
 
     print("\nSize of the top 2 speakers' sentence lists after downsampling:")
     for speaker in top_2_speakers:
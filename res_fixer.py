@@ -1,81 +1,206 @@
+import argparse
 import json
 from collections import defaultdict
 import os
 import re
 
+from checkpoint import checkpoint_path, count_newlines, plan_resume, save_checkpoint
+from corpus_io import find_corpus, is_compressed
+from corpus_store import CorpusStore
+from field_scanner import read_numbered_byte_lines
+from lexicon import departments, title_matcher, titles
+from metrics import RunMetrics, profiled
+from name_cache import NormalizationCache, rules_fingerprint
+from parallel_scan import map_chunks
+
 # Define the path to the file located in the same directory as the script
-file_path = os.path.join(os.path.dirname(__file__), "result_orig.jsonl")
-
-# Titles and departments to remove from names
-titles = [
-    '<<.*>>', 'תשובת', 'הד"ר', 'ד"ר', 'מ"מ היו"ר', 'היו"ר', 'יו"ר', 'נשיא הפרלמנט האירופי', 'שר', 'שרת',
-    'עו"ד', 'המשנה לראש הממשלה', 'משנה לראש הממשלה', 'ראש הממשלה', 'נצ"מ', 'מר', 'ניצב', 'טפסר משנה', 'רשף',
-    "פרופ'", 'סגן', 'סגנית', 'השר', 'השרה', 'מזכיר', 'מזכירת', 'ועדת'
-]
-departments = [
-    'הכנסת', 'הכלכלה', 'הכלכלה והתכנון', 'האנרגיה והמים', 'החינוך', 'החינוך והתרבות',
-    'התשתיות הלאומיות', 'התשתיות הלאומיות, האנרגיה והמים', 'חינוך', 'המודיעין', 'לשיתוף פעולה אזורי',
-    'ההסברה והתפוצות', 'האוצר', 'להגנת הסביבה', 'התעשייה, המסחר והתעסוקה', 'לאיכות הסביבה',
-    'התרבות והספורט', 'התשתיות', 'המשפטים', 'הרווחה', 'הרווחה והשירותים החברתיים', 'הבינוי והשיכון',
-    'התחבורה והבטיחות בדרכים', 'המשטרה', 'הבריאות', 'החקלאות ופיתוח הכפר', 'התקשורת',
-    'במשרד ראש הממשלה', 'הפנים', 'הביטחון', 'לביטחון פנים', 'המדע והטכנולוגיה', 'העלייה והקליטה',
-    'לקליטת העלייה', 'התיירות', 'החוץ', 'המדע,', 'למודיעין', 'לאזרחים ותיקים', 'לענייני דתות', 'לענייני מודיעין',
-    'המדע', 'התרבות', 'הספורט', 'תרבות', 'ספורט'
-]
-
-# Compile a regex pattern to match titles and departments
-# The pattern will remove any of the specified titles or departments from the speaker's name
-bad_words_pattern = re.compile(rf"({'|'.join(map(re.escape, titles + departments))})", re.IGNORECASE)
+# (or its .gz, .xz or .bz2 archive when there is no uncompressed copy)
+file_path = find_corpus(os.path.join(os.path.dirname(__file__), "result_orig.jsonl"))
 
 # Function to normalize full names by removing titles and departments
 def normalize_full_name(full_name):
     # Remove any titles or departments from the name
-    cleaned_name = bad_words_pattern.sub("", full_name).strip()
+    cleaned_name = title_matcher.strip(full_name).strip()
 
     # Remove any extra spaces that might have been left after removal
     cleaned_name = re.sub(r'\s+', ' ', cleaned_name)
 
     return cleaned_name
 
-# Initialize counter and set for variations
-burg_count = 0
-burg_variations = set()
-
-# Read and process the JSONL file
-try:
-    with open(file_path, "r", encoding="utf-8") as file:
-        for line_number, line in enumerate(file, start=1):
-            try:
-                # Parse each line as JSON
-                record = json.loads(line)
-                if "speaker_name" in record:
-                    speaker_name = record["speaker_name"]
-
-                    # Normalize the speaker's full name by removing titles and departments
-                    normalized_name = normalize_full_name(speaker_name)
-
-                    # Split the normalized name to extract the last name
-                    name_parts = normalized_name.split(" ")
-                    if len(name_parts) >= 1:
-                        last_name = name_parts[-1]
-
-                        # Check if the last name is "בורג"
-                        if last_name == "בורג":
-                            burg_count += 1
-                            burg_variations.add(speaker_name)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error on line {line_number}: {e}")
-                continue  # Skip lines with JSON errors
-
-except FileNotFoundError:
-    print(f"Error: File not found at {file_path}")
-    exit()
-except Exception as e:
-    print(f"An unexpected error occurred: {e}")
-    exit()
-
-# Print the results
-print(f"Total number of sentences where the speaker's last name is 'בורג': {burg_count}")
-print("\nVarious ways 'בורג' appears in the speaker_name column:")
-for variation in sorted(burg_variations):
-    print(f"- {variation}")
+# Each distinct raw speaker name is stripped only once
+cached_normalize_full_name = NormalizationCache(normalize_full_name, rules_fingerprint(titles, departments))
+
+# Stage timings and counters for --metrics-json (disabled unless requested)
+metrics = RunMetrics("surname")
+
+# The surname searched for unless --surname is given
+SURNAME = "בורג"
+
+def find_surname_variations(lines, surname=SURNAME):
+    """
+    Counts the sentences whose normalized speaker name ends with `surname` ("בורג" by
+    default) and collects the raw speaker names they appear under. Takes (line_number,
+    line) pairs with the lines as bytes and also returns the JSON parsing errors.
+    """
+    # Initialize counter and set for variations
+    surname_count = 0
+    surname_variations = set()
+    errors = []
+
+    for line_number, line in lines:
+        try:
+            # Parse each line as JSON
+            record = json.loads(line)
+            if "speaker_name" in record:
+                speaker_name = record["speaker_name"]
+
+                # Normalize the speaker's full name by removing titles and departments
+                normalized_name = cached_normalize_full_name(speaker_name)
+
+                # Split the normalized name to extract the last name
+                name_parts = normalized_name.split(" ")
+                if len(name_parts) >= 1:
+                    last_name = name_parts[-1]
+
+                    # Check if the last name is the surname searched for
+                    if last_name == surname:
+                        surname_count += 1
+                        surname_variations.add(speaker_name)
+        except json.JSONDecodeError as e:
+            errors.append((line_number, str(e)))
+            continue  # Skip lines with JSON errors
+    return surname_count, surname_variations, errors
+
+def find_surname_variations_in_store(store, surname=SURNAME):
+    """
+    Same count over a columnar corpus store: every distinct raw name is checked once and
+    contributes the number of rows it appears in.
+    """
+    surname_count = 0
+    surname_variations = set()
+    raw_names = store.dictionaries["speaker_name"]
+    for code, count in store.code_counts("speaker_name"):
+        speaker_name = raw_names[code]
+        if cached_normalize_full_name(speaker_name).split(" ")[-1] == surname:
+            surname_count += count
+            surname_variations.add(speaker_name)
+    return surname_count, surname_variations, list(store.errors)
+
+def merge_surname_chunks(chunks):
+    """
+    Merges (line_offset, result) chunks in file order. Returns the count, the variations
+    and the JSON parsing errors with file line numbers.
+    """
+    surname_count = 0
+    surname_variations = set()
+    all_errors = []
+    for line_offset, (chunk_count, chunk_variations, errors) in chunks:
+        all_errors.extend((line_offset + line_number, message) for line_number, message in errors)
+        surname_count += chunk_count
+        surname_variations.update(chunk_variations)
+    return surname_count, surname_variations, all_errors
+
+def find_surname_variations_checkpointed(checkpoint_file, workers=1, surname=SURNAME):
+    """
+    Scans only the lines appended since the checkpoint was saved (everything if it is
+    missing or the file was rewritten), then saves a checkpoint up to the last complete line.
+    """
+    fingerprint = f"surname:{surname}:" + cached_normalize_full_name.fingerprint
+    saved, start, line_offset, end = plan_resume(checkpoint_file, file_path, fingerprint)
+    chunks = []
+    if saved is not None:
+        print(f"Resuming from checkpoint at line {line_offset}")
+        state = saved["state"]
+        errors = [tuple(error) for error in state["errors"]]
+        chunks.append((0, (state["surname_count"], set(state["surname_variations"]), errors)))
+    new_chunks = map_chunks(find_surname_variations, file_path, workers, surname, start=start, end=end,
+                            reader=read_numbered_byte_lines, on_lines=metrics.stage_lines)
+    chunks.extend((line_offset + chunk_offset, result) for chunk_offset, result in new_chunks)
+    surname_count, surname_variations, errors = merge_surname_chunks(chunks)
+
+    lines = line_offset + count_newlines(file_path, start, end)
+    save_checkpoint(checkpoint_file, file_path, fingerprint, end, lines,
+                    {"surname_count": surname_count, "surname_variations": sorted(surname_variations),
+                     "errors": errors})
+
+    # A last line without a newline may still be growing: count it, but not in the checkpoint
+    tail_chunks = map_chunks(find_surname_variations, file_path, 1, surname, start=end,
+                             reader=read_numbered_byte_lines, on_lines=metrics.stage_lines)
+    tail = [(lines + chunk_offset, result) for chunk_offset, result in tail_chunks]
+    return [(0, (surname_count, surname_variations, errors))] + tail
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the ways a surname ('בורג' by default) appears in speaker names.")
+    parser.add_argument("--surname", default=SURNAME, help="last name to look for (default: %(default)s)")
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="scan newline-aligned chunks of the corpus in N processes",
+    )
+    parser.add_argument(
+        "--store", metavar="DIR",
+        help="read a columnar corpus store built by corpus_store.py instead of parsing the JSONL file",
+    )
+    parser.add_argument(
+        "--checkpoint", nargs="?", const=checkpoint_path(file_path, "surname"), default=None, metavar="PATH",
+        help="save the results to PATH (default: next to the corpus) and on later runs scan only "
+             "the lines appended since then",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH",
+        help="write stage timings, lines/sec, error counts, cache hit rate and peak memory to PATH ('-' for stdout)",
+    )
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="run under cProfile and save the stats to PATH (view with: python -m pstats PATH)",
+    )
+    args = parser.parse_args(argv)
+    if args.store and args.checkpoint:
+        parser.error("--checkpoint cannot be combined with --store")
+    if args.checkpoint and is_compressed(file_path):
+        parser.error(f"--checkpoint needs random access and cannot read the compressed {file_path}")
+    if args.metrics_json is not None:
+        metrics.enable()
+        # Time spent stripping titles and departments from new names in this process
+        cached_normalize_full_name.normalize = metrics.timed("normalize", cached_normalize_full_name.normalize)
+    try:
+        with profiled(args.profile):
+            run_analysis(args)
+    finally:
+        metrics.set("name_cache", cached_normalize_full_name.stats())
+        metrics.write(args.metrics_json)
+
+def run_analysis(args):
+
+    # Read and process the JSONL file (or its columnar store)
+    metrics.lap("scan")
+    try:
+        if args.store:
+            with CorpusStore(args.store) as store:
+                chunks = [(0, find_surname_variations_in_store(store, args.surname))]
+        elif args.checkpoint:
+            chunks = find_surname_variations_checkpointed(args.checkpoint, args.workers, args.surname)
+        else:
+            chunks = map_chunks(find_surname_variations, file_path, args.workers, args.surname,
+                                reader=read_numbered_byte_lines, on_lines=metrics.stage_lines)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.store or file_path}")
+        exit()
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        exit()
+
+    # Merge the chunks in file order
+    surname_count, surname_variations, errors = merge_surname_chunks(chunks)
+    metrics.lap("report")
+    metrics.set("json_errors", len(errors))
+    for line_number, message in errors:
+        print(f"JSON parsing error on line {line_number}: {message}")
+
+    # Print the results
+    print(f"Total number of sentences where the speaker's last name is '{args.surname}': {surname_count}")
+    print(f"\nVarious ways '{args.surname}' appears in the speaker_name column:")
+    for variation in sorted(surname_variations):
+        print(f"- {variation}")
+
+if __name__ == "__main__":
+    main()
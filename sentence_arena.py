@@ -0,0 +1,123 @@
+import json
+import random
+import sys
+from array import array
+
+# UTF-8 never contains this byte, so it marks a sentence_text that is not a string (null,
+# a number...) and is kept as its JSON text; it reads back as the same JSON value
+NON_STRING_MARKER = 0xFF
+
+def encode_sentence(sentence):
+    """
+    UTF-8 bytes of a sentence_text as the arena and corpus_store.build_store keep it.
+    """
+    if isinstance(sentence, str):
+        return sentence.encode("utf-8")
+    return bytes([NON_STRING_MARKER]) + json.dumps(sentence, ensure_ascii=False).encode("utf-8")
+
+def decode_sentence(data):
+    """
+    Inverse of `encode_sentence` (`data` is bytes or a bytearray).
+    """
+    if data and data[0] == NON_STRING_MARKER:
+        return json.loads(data[1:].decode("utf-8"))
+    return data.decode("utf-8")
+
+class SentenceArena:
+    """
+    List-like container of sentences kept as UTF-8 in one bytearray, with the start and
+    end offset of every sentence in two array('Q') columns. A sentence costs its UTF-8
+    bytes plus 16 bytes of offsets, instead of a str object (two bytes per character for
+    Hebrew, plus its header) and a list slot, and is only decoded when it is read.
+    A sentence_text that is not a string reads back as the same JSON value.
+
+    Slices, copies and shuffles share the bytes and only move offsets. Written bytes are
+    never changed, so an arena and the views made from it can be appended to
+    independently; the bytes of every sentence stay allocated as long as any of them is
+    alive.
+    """
+
+    def __init__(self, sentences=()):
+        self._blob = bytearray()
+        self._starts = array("Q")
+        self._ends = array("Q")
+        # True while the sentences are laid out back to back in the order they were added,
+        # so `extend` can copy the whole buffer at once
+        self._dense = True
+        self.extend(sentences)
+
+    def _view(self, starts, ends):
+        view = SentenceArena()
+        view._blob = self._blob
+        view._starts = starts
+        view._ends = ends
+        view._dense = False
+        return view
+
+    def append(self, sentence):
+        blob = self._blob
+        self._starts.append(len(blob))
+        blob += encode_sentence(sentence)
+        self._ends.append(len(blob))
+
+    def append_encoded(self, data):
+        """
+        Appends a sentence that is already encoded by `encode_sentence` (bytes or any
+        buffer, e.g. a slice of a memory-mapped column), without decoding it.
+        """
+        self._starts.append(len(self._blob))
+        self._blob += data
+        self._ends.append(len(self._blob))
+
+    def extend(self, sentences):
+        if isinstance(sentences, SentenceArena):
+            if sentences._dense:
+                # E.g. the arena of a parallel chunk: one copy of its buffer
+                base = len(self._blob)
+                starts = array("Q", (start + base for start in sentences._starts))
+                ends = array("Q", (end + base for end in sentences._ends))
+                # A bytearray cannot be resized while it is read from, as in a.extend(a)
+                self._blob += sentences._blob if sentences is not self else bytes(self._blob)
+                self._starts += starts
+                self._ends += ends
+            else:
+                blob = sentences._blob
+                for start, end in zip(sentences._starts, sentences._ends):
+                    self.append_encoded(blob[start:end])
+        else:
+            for sentence in sentences:
+                self.append(sentence)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        blob = self._blob
+        for start, end in zip(self._starts, self._ends):
+            yield decode_sentence(blob[start:end])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._view(self._starts[index], self._ends[index])
+        return decode_sentence(self._blob[self._starts[index]:self._ends[index]])
+
+    def copy(self):
+        return self._view(self._starts[:], self._ends[:])
+
+    def shuffle(self, rng=random):
+        """
+        Shuffles the sentences in place by permuting their offsets. The permutation is the
+        one `rng.shuffle` gives a list of the same length, so a seeded run draws the same
+        sentences as it would from a list.
+        """
+        order = list(range(len(self)))
+        rng.shuffle(order)
+        self._starts = array("Q", map(self._starts.__getitem__, order))
+        self._ends = array("Q", map(self._ends.__getitem__, order))
+        self._dense = False
+
+    def memory_size(self):
+        """
+        Bytes allocated for the buffer and the offsets (the buffer is shared with views).
+        """
+        return sys.getsizeof(self._blob) + sys.getsizeof(self._starts) + sys.getsizeof(self._ends)
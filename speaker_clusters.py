@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import print_top_5_common_speakers as top_speakers
+from field_scanner import read_numbered_byte_lines
+from fused_scan import count_raw_names
+from heavy_hitters import top_k
+from parallel_scan import map_chunks, merge_counts
+
+# Where the candidate map is written; review it and save it as speaker_map.json to use it
+candidates_path = os.path.join(os.path.dirname(__file__), "speaker_map.candidates.json")
+
+# A first name that is only an initial, such as "א'"
+INITIAL = re.compile(r"^[א-ת]['׳.]?$")
+
+def edit_limit(length):
+    """
+    Edit operations tolerated between two names of the given (shorter) length; short
+    names differ in a letter too often to be merged on spelling alone.
+    """
+    if length < 4:
+        return 0
+    if length < 8:
+        return 1
+    return 2
+
+def within_distance(a, b, limit):
+    """
+    Whether the Levenshtein distance of `a` and `b` is at most `limit`; gives up on a
+    pair as soon as every alignment exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    # A shared prefix and suffix do not change the distance; variants of a name usually
+    # differ in one spot, so little is left to compare
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+def similar(a, b):
+    return a == b or within_distance(a, b, edit_limit(min(len(a), len(b))))
+
+class DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # The lower index (earlier first appearance) stays the root
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+def deletions(value, depth):
+    """
+    Every string `value` turns into with up to `depth` letters deleted. Two strings are
+    within edit distance d only if deleting up to d letters from each makes them equal,
+    so similar names always share one of these keys.
+    """
+    variants = {value}
+    for _ in range(depth):
+        variants |= {variant[:index] + variant[index + 1:] for variant in variants for index in range(len(variant))}
+    return variants
+
+def link_similar(members, clusters):
+    """
+    Unions the names of every pair of similar values in a block; `members` maps each
+    value to the indices of the names that have it. Only values that share a deletion
+    key are compared, instead of every pair in the block.
+    """
+    by_deletion = defaultdict(list)
+    for value in members:
+        for variant in deletions(value, edit_limit(len(value))):
+            by_deletion[variant].append(value)
+    compared = set()
+    for values in by_deletion.values():
+        for position, a in enumerate(values):
+            for b in values[position + 1:]:
+                if (a, b) not in compared:
+                    compared.add((a, b))
+                    if similar(a, b):
+                        clusters.union(members[a][0], members[b][0])
+
+def cluster_names(name_counts):
+    """
+    Groups cleaned speaker names (title-free, as `clean_full_name` returns them) into
+    speakers. Takes (name, sentence count) pairs and returns the clusters as lists of
+    (name, count) pairs, most frequent cluster first, plus the initial-only names that
+    fit more than one cluster.
+
+    Names are only compared inside blocks, so the work grows with the block sizes
+    instead of the square of the number of names:
+    1. (surname, first letter of the first name): first names that are equal after
+       nickname_map or within a small edit distance are merged; names with only an
+       initial join the block's speaker if it has exactly one.
+    2. (first name, first letter of the surname): surnames within a small edit distance
+       are merged, which catches misspelled surnames.
+    Names already listed in speaker_map are compared in their mapped form.
+    """
+    names = []
+    first_names = []
+    surnames = []
+    for name, count in name_counts:
+        parts = top_speakers.speaker_map.get(name, name).split(" ", 1)
+        if len(parts) != 2:
+            continue
+        first_name, surname = parts
+        names.append((name, count))
+        first_names.append(top_speakers.nickname_map.get(first_name, first_name))
+        surnames.append(surname)
+    clusters = DisjointSet(len(names))
+
+    # Pass 1: same surname and initial, similar first names
+    surname_blocks = defaultdict(lambda: defaultdict(list))
+    initials = defaultdict(list)
+    for index, (first_name, surname) in enumerate(zip(first_names, surnames)):
+        if INITIAL.match(first_name):
+            initials[(surname, first_name[0])].append(index)
+        else:
+            surname_blocks[(surname, first_name[0])][first_name].append(index)
+    for members in surname_blocks.values():
+        for indices in members.values():
+            for index in indices[1:]:
+                clusters.union(indices[0], index)
+        link_similar(members, clusters)
+
+    # Pass 2: same first name and surname initial, similar surnames
+    first_name_blocks = defaultdict(lambda: defaultdict(list))
+    for index, (first_name, surname) in enumerate(zip(first_names, surnames)):
+        if not INITIAL.match(first_name):
+            first_name_blocks[(first_name, surname[0])][surname].append(index)
+    for members in first_name_blocks.values():
+        link_similar(members, clusters)
+
+    # Initials join the block's speaker only when there is no doubt which one it is
+    ambiguous = []
+    for block, indices in initials.items():
+        members = surname_blocks.get(block, {})
+        roots = {clusters.find(index) for member_indices in members.values() for index in member_indices}
+        if len(roots) == 1:
+            root = roots.pop()
+            for index in indices:
+                clusters.union(root, index)
+        elif roots:
+            ambiguous.extend(names[index] for index in indices)
+
+    grouped = defaultdict(list)
+    for index, name_count in enumerate(names):
+        grouped[clusters.find(index)].append(name_count)
+    ranked = sorted(grouped.values(), key=lambda members: sum(count for name, count in members), reverse=True)
+    return ranked, ambiguous
+
+def canonical_name(members):
+    """
+    The most frequent member with a full first name, with its first name expanded through
+    nickname_map, or None if every member is an initial.
+    """
+    best = None
+    for name, count in members:
+        first_name, surname = top_speakers.speaker_map.get(name, name).split(" ", 1)
+        if INITIAL.match(first_name):
+            continue
+        if best is None or count > best[1]:
+            best = (f"{top_speakers.nickname_map.get(first_name, first_name)} {surname}", count)
+    return best[0] if best else None
+
+def candidate_speaker_map(clusters):
+    """
+    speaker_map entries for every cluster with more than one name: every member, and the
+    canonical name itself, map to the canonical name. Names that speaker_map already
+    lists are left to it.
+    """
+    candidates = {}
+    for members in clusters:
+        canonical = canonical_name(members)
+        if canonical is None or len(members) < 2:
+            continue
+        for name in [canonical] + [name for name, count in members]:
+            if name not in top_speakers.speaker_map:
+                candidates[name] = canonical
+    return candidates
+
+def cleaned_name_counts(raw_counts):
+    """
+    Sums the sentence counts of raw speaker names per cleaned name, in the order of
+    first appearance.
+    """
+    name_counts = defaultdict(int)
+    for raw_name, count in raw_counts.items():
+        name_counts[top_speakers.clean_full_name(raw_name)] += count
+    return name_counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cluster speaker-name variants and write a candidate speaker_map for review."
+    )
+    parser.add_argument("--corpus", default=top_speakers.file_path, metavar="PATH", help="JSONL file to read the names from")
+    parser.add_argument(
+        "--output", default=candidates_path, metavar="PATH",
+        help="candidate map to write (default: %(default)s); save it as speaker_map.json next to "
+             "print_top_5_common_speakers.py to have normalize_full_name use it",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="scan newline-aligned chunks of the corpus in N processes",
+    )
+    parser.add_argument("--show", type=int, default=10, metavar="N", help="print the N largest merged clusters")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        chunks = map_chunks(count_raw_names, args.corpus, args.workers, reader=read_numbered_byte_lines)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.corpus}")
+        sys.exit(1)
+    raw_counts = merge_counts(raw_counts for line_offset, (raw_counts, errors) in chunks)
+    name_counts = cleaned_name_counts(raw_counts)
+    scanned = time.perf_counter()
+
+    clusters, ambiguous = cluster_names(name_counts.items())
+    candidates = candidate_speaker_map(clusters)
+    clustered = time.perf_counter()
+
+    merged = [members for members in clusters if len(members) > 1]
+    print(f"{len(raw_counts)} raw names, {len(name_counts)} distinct cleaned names, "
+          f"{len(clusters)} speakers, {len(merged)} with variants, {len(candidates)} speaker_map candidates")
+    print(f"Scan: {scanned - start:.2f}s, clustering: {clustered - scanned:.2f}s "
+          f"({len(name_counts) / max(clustered - scanned, 1e-9):,.0f} names/sec)")
+
+    for members in merged[:args.show]:
+        print(f"\n{canonical_name(members)}:")
+        for name, count in top_k(dict(members), len(members)):
+            print(f"  {name}: {count}")
+    if ambiguous:
+        print(f"\n{len(ambiguous)} initial-only names fit several speakers and were left out, e.g. "
+              f"{', '.join(name for name, count in ambiguous[:5])}")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({
+            "version": 1,
+            "source": os.path.abspath(args.corpus),
+            "speaker_map": candidates,
+            "clusters": [[canonical_name(members), members] for members in merged],
+            "ambiguous_initials": ambiguous,
+        }, file, ensure_ascii=False, indent=2)
+    print(f"\nWrote {len(candidates)} candidate mappings to {args.output}")
+
+if __name__ == "__main__":
+    main()
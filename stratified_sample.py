@@ -0,0 +1,124 @@
+import argparse
+import hashlib
+import json
+import sys
+
+import print_top_5_common_speakers as top_speakers
+from field_scanner import read_numbered_byte_lines
+from heavy_hitters import top_k
+from parallel_scan import map_chunks
+
+# The fields that identify a record (and so decide its sampling key) and its stratum
+IDENTITY_FIELDS = ["protocol_name", "protocol_number", "speaker_name", "sentence_text"]
+STRATUM_FIELDS = ["kneset_number", "protocol_type"]
+
+def record_key(record, seed=0):
+    """
+    Sampling key of a record: a seeded 64-bit hash of its identity fields. It depends on
+    nothing but the record and the seed, so it is the same in every process, run and
+    machine (unlike `hash()` or the global random state).
+    """
+    identity = json.dumps([record.get(field) for field in IDENTITY_FIELDS], ensure_ascii=False)
+    digest = hashlib.blake2b(identity.encode("utf-8"), digest_size=8, key=str(seed).encode("utf-8")).digest()
+    return int.from_bytes(digest, "big")
+
+def sample_strata(lines, speakers, quota, seed=0):
+    """
+    Keeps the `quota` records with the lowest keys in every (speaker, kneset_number,
+    protocol_type) stratum of the given normalized speakers. Which records those are does
+    not depend on the order they are read in, so chunks can be sampled independently
+    and merged with `merge_strata`.
+
+    Takes (line_number, line) pairs with the lines as bytes and returns a dict of stratum
+    -> [size, heap of (-key, -line_number, line)] in the order of first appearance.
+    Lines that are not valid JSON are skipped (the counting pass reports them).
+    """
+    speakers = set(speakers)
+    strata = {}
+    for line_number, line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "speaker_name" not in record or "sentence_text" not in record:
+            continue
+        speaker = top_speakers.cached_normalize_full_name(record["speaker_name"])
+        if speaker not in speakers:
+            continue
+        stratum = (speaker, record.get("kneset_number"), record.get("protocol_type"))
+        entry = strata.get(stratum)
+        if entry is None:
+            entry = strata[stratum] = [0, []]
+        entry[0] += 1
+        # Equal keys (duplicate records) keep the earlier line
+        top_speakers.push_bounded(entry[1], (-record_key(record, seed), -line_number, line), quota)
+    return strata
+
+def merge_strata(chunks, quota):
+    """
+    Merges (line_offset, strata) chunks in file order into stratum -> (size, sampled
+    lines as (line_number, line) in file order).
+    """
+    merged = {}
+    for line_offset, strata in chunks:
+        for stratum, (size, heap) in strata.items():
+            entry = merged.get(stratum)
+            if entry is None:
+                entry = merged[stratum] = [0, []]
+            entry[0] += size
+            for neg_key, neg_line_number, line in heap:
+                top_speakers.push_bounded(entry[1], (neg_key, neg_line_number - line_offset, line), quota)
+    return {
+        stratum: (size, sorted((-neg_line_number, line) for neg_key, neg_line_number, line in heap))
+        for stratum, (size, heap) in merged.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Draw a reproducible sample of the top speakers' sentences with a quota per "
+                    "(speaker, kneset_number, protocol_type) stratum."
+    )
+    parser.add_argument("--speakers", type=int, default=2, metavar="N", help="sample the N most frequent speakers")
+    parser.add_argument("--per-stratum", type=int, default=100, metavar="Q", help="records kept per stratum")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the record hash; the same seed gives the same sample")
+    parser.add_argument("--corpus", default=top_speakers.file_path, metavar="PATH", help="JSONL file to sample")
+    parser.add_argument("--output", metavar="PATH", help="write the sampled lines to PATH in file order")
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="count and sample newline-aligned chunks of the corpus in N processes",
+    )
+    args = parser.parse_args(argv)
+    if args.speakers < 1 or args.per_stratum < 1:
+        parser.error("--speakers and --per-stratum must be at least 1")
+
+    # First pass: count the sentences per speaker to find the top N
+    try:
+        unique_speaker_counter, errors = top_speakers.run_first_pass(args.corpus, args.workers)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.corpus}")
+        sys.exit(1)
+    top_speakers.print_json_errors(errors)
+    speakers = [speaker for speaker, count in top_k(unique_speaker_counter, args.speakers)]
+    print(f"Sampling {args.per_stratum} sentences per stratum of: {', '.join(speakers)}")
+
+    # Second pass: sample every stratum by the lowest record keys
+    chunks = map_chunks(sample_strata, args.corpus, args.workers, speakers, args.per_stratum, args.seed,
+                        reader=read_numbered_byte_lines)
+    strata = merge_strata(chunks, args.per_stratum)
+
+    print("\nspeaker | kneset_number | protocol_type: sampled of available")
+    for speaker in speakers:
+        for (stratum_speaker, kneset_number, protocol_type), (size, sample) in strata.items():
+            if stratum_speaker == speaker:
+                print(f"{speaker} | {kneset_number} | {protocol_type}: {len(sample)} of {size}")
+
+    sampled = sorted(line for size, sample in strata.values() for line in sample)
+    print(f"\nSampled {len(sampled)} sentences from {len(strata)} strata")
+    if args.output:
+        with open(args.output, "wb") as file:
+            for line_number, line in sampled:
+                file.write(line if line.endswith(b"\n") else line + b"\n")
+        print(f"Wrote the sample to {args.output}")
+
+if __name__ == "__main__":
+    main()
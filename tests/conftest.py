@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules under test live in the repository root (and idan/)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "idan"))
@@ -0,0 +1,37 @@
+from benchmarks.generate_corpus import generate_corpus
+from checkpoint import plan_resume, save_checkpoint
+
+def checkpoint_corpus(tmp_path):
+    corpus = str(tmp_path / "result.jsonl")
+    generate_corpus(corpus, 20_000, 0)
+    path = corpus + ".test.ckpt.json"
+    saved, start, lines, end = plan_resume(path, corpus, "rules")
+    save_checkpoint(path, corpus, "rules", end, 20_000, {"count": 1})
+    return corpus, path, end
+
+def test_resumes_after_an_append(tmp_path):
+    corpus, path, end = checkpoint_corpus(tmp_path)
+    with open(corpus, "ab") as file:
+        file.write('{"speaker_name": "חדש"}\n'.encode("utf-8"))
+
+    saved, start, lines, new_end = plan_resume(path, corpus, "rules")
+    assert saved["state"] == {"count": 1}
+    assert (start, lines) == (end, 20_000)
+    assert new_end > end
+
+def test_rewrite_in_the_middle_forces_a_rescan(tmp_path):
+    corpus, path, end = checkpoint_corpus(tmp_path)
+    with open(corpus, "r+b") as file:
+        # Same size, six bytes changed far from both ends of the checkpointed prefix
+        file.seek(end // 2)
+        file.write(b"xxxxxx")
+
+    saved, start, lines, new_end = plan_resume(path, corpus, "rules")
+    assert saved is None
+    assert (start, lines, new_end) == (0, 0, end)
+
+def test_other_rules_force_a_rescan(tmp_path):
+    corpus, path, end = checkpoint_corpus(tmp_path)
+    saved, start, lines, new_end = plan_resume(path, corpus, "other rules")
+    assert saved is None
+    assert start == 0
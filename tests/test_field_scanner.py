@@ -0,0 +1,22 @@
+from benchmarks.generate_corpus import generate_corpus
+from field_scanner import read_numbered_byte_lines
+from parallel_scan import chunk_ranges, read_numbered_lines
+
+def test_byte_reader_matches_the_text_reader(tmp_path):
+    path = str(tmp_path / "result.jsonl")
+    generate_corpus(path, 5_000, 0)
+    with open(path, "ab") as file:
+        # A last line without a newline
+        file.write('{"speaker_name": "סוף"}'.encode("utf-8"))
+
+    def encoded(lines):
+        return [(line_number, line.encode("utf-8")) for line_number, line in lines]
+
+    assert list(read_numbered_byte_lines(path)) == encoded(read_numbered_lines(path))
+    for start, end in chunk_ranges(path, 7):
+        assert list(read_numbered_byte_lines(path, start, end)) == encoded(read_numbered_lines(path, start, end))
+
+def test_byte_reader_on_an_empty_file(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_bytes(b"")
+    assert list(read_numbered_byte_lines(str(path))) == []
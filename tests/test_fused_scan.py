@@ -0,0 +1,9 @@
+import pytest
+
+import fused_scan
+
+@pytest.mark.parametrize("top", ["0", "-1"])
+def test_top_must_be_positive(top, capsys):
+    with pytest.raises(SystemExit):
+        fused_scan.main(["--top", top])
+    assert "--top must be at least 1" in capsys.readouterr().err
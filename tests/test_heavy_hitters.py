@@ -0,0 +1,94 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+import print_top_5_common_speakers as top
+from heavy_hitters import SpaceSaving, top_k
+from name_cache import NormalizationCache
+
+def summarize(stream, capacity, parts=1, rng=None):
+    # One summary per consecutive part of the stream, merged like parallel chunks
+    bounds = [0, len(stream)]
+    if parts > 1:
+        bounds = [0] + sorted(rng.randint(0, len(stream)) for _ in range(parts - 1)) + [len(stream)]
+    summaries = []
+    for start, end in zip(bounds, bounds[1:]):
+        summary = SpaceSaving(capacity)
+        for key in stream[start:end]:
+            summary.add(key)
+        summaries.append(summary)
+    return summaries[0] if len(summaries) == 1 else SpaceSaving.merged(summaries, capacity)
+
+def check_against_counter(summary, stream, ks=(1, 2, 3, 5)):
+    true = Counter(stream)
+    assert summary.total == len(stream)
+    for key, count in summary.items():
+        assert count - summary.errors[key] <= true[key] <= count
+    for key, count in true.items():
+        if key not in summary:
+            assert count <= summary.minimum()
+    for k in ks:
+        top, guaranteed = summary.top(k)
+        if guaranteed:
+            # Every reported key occurs at least as often as every key left out
+            reported = {key for key, count, error in top}
+            left_out = max((count for key, count in true.items() if key not in reported), default=0)
+            assert all(true[key] >= left_out for key in reported), (stream, k, top)
+            assert len(reported) == min(k, len(true))
+
+def test_top_k_ranks_like_a_sorted_slice():
+    counts = {"a": 3, "b": 5, "c": 3, "d": 5, "e": 1}
+    for k in range(7):
+        assert top_k(counts, k) == sorted(counts.items(), key=lambda item: item[1], reverse=True)[:k]
+
+def test_guarantee_checks_every_reported_key():
+    summary = summarize(list("eccbcededa"), 3)
+    top, guaranteed = summary.top(2)
+    assert [key for key, count, error in top] == ["a", "e"]
+    assert not guaranteed
+    check_against_counter(summary, list("eccbcededa"))
+
+def test_exact_while_under_capacity():
+    stream = list("abracadabra")
+    summary = summarize(stream, 10)
+    assert dict(summary.items()) == dict(Counter(stream))
+    assert all(error == 0 for error in summary.errors.values())
+    assert summary.top(2) == ([("a", 5, 0), ("b", 2, 0)], True)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_small_streams_against_counter(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        stream = [rng.choice("abcdef") for _ in range(rng.randint(0, 12))]
+        check_against_counter(summarize(stream, rng.randint(1, 4)), stream)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_merged_summaries_against_counter(seed):
+    rng = random.Random(seed)
+    keys = rng.randint(1, 300)
+    stream = [int(rng.paretovariate(1.2)) % keys for _ in range(rng.randint(0, 3000))]
+    check_against_counter(summarize(stream, rng.randint(1, 60), rng.randint(1, 5), rng), stream)
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+
+@pytest.mark.parametrize("capacity, expected", [
+    # Five names for three slots: the top 2 is guaranteed, but משה כהן (2 sentences)
+    # is reported with 4 and ranked above נועה שחר (3 sentences)
+    (3, "The top 2 speakers are guaranteed but their order is not; the counts are upper bounds"),
+    (5, "The top 2 ranking (membership and order) is guaranteed; the counts are exact"),
+])
+def test_summary_states_what_the_ranking_guarantees(tmp_path, monkeypatch, capsys, capacity, expected):
+    path = tmp_path / "result.jsonl"
+    names = {"A": "משה כהן", "B": "דנה לוי", "C": "רון בר", "D": "טל גל", "E": "נועה שחר"}
+    speakers = [names[letter] for letter in "BEDDECAEA"]
+    path.write_text("".join(
+        json.dumps({"speaker_name": speaker, "sentence_text": "משפט"}, ensure_ascii=False) + "\n" for speaker in speakers
+    ), encoding="utf-8")
+    monkeypatch.setattr(top, "file_path", str(path))
+    monkeypatch.setattr(top, "cached_normalize_full_name", NormalizationCache(top.normalize_full_name, "test"))
+    top.main(["--heavy-hitters", str(capacity), "--top", "2"])
+    assert expected in capsys.readouterr().out
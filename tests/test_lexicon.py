@@ -0,0 +1,53 @@
+import random
+
+from lexicon import TermMatcher, departments, title_matcher, titles
+
+def leftmost_longest(terms, text, whole_words=False):
+    """
+    Reference spans: at each position take the longest term that fits (and sits on word
+    boundaries in whole-word mode), then continue after it.
+    """
+    def boundary(position):
+        before = position > 0 and (text[position - 1].isalnum() or text[position - 1] == "_")
+        after = position < len(text) and (text[position].isalnum() or text[position] == "_")
+        return before != after
+
+    spans = []
+    position = 0
+    while position < len(text):
+        ends = [
+            position + len(term) for term in terms
+            if text.startswith(term, position)
+            and (not whole_words or (boundary(position) and boundary(position + len(term))))
+        ]
+        if ends:
+            spans.append((position, max(ends)))
+            position = max(ends)
+        else:
+            position += 1
+    return spans
+
+def test_longest_term_wins_regardless_of_list_order():
+    for terms in (["שר", "השר"], ["השר", "שר"]):
+        matcher = TermMatcher(terms)
+        assert matcher.findall("השר דן מרידור") == ["השר"]
+        assert matcher.strip("השר דן מרידור") == " דן מרידור"
+    assert title_matcher.findall("שר הכלכלה והתכנון") == ["שר", "הכלכלה והתכנון"]
+    assert title_matcher.strip("שר הכלכלה והתכנון יצחק לוי").split() == ["יצחק", "לוי"]
+
+def test_whole_words_falls_back_to_a_shorter_term():
+    matcher = TermMatcher(["המדע", "המדע,"])
+    # 'המדע,' does not end on a word boundary before a space, so the match is 'המדע'
+    assert matcher.find("המדע, x", whole_words=True) == [(0, 4)]
+    assert matcher.find("המדע,x", whole_words=True) == [(0, 5)]
+    assert title_matcher.findall("מרדכי", whole_words=True) == []
+    assert title_matcher.findall("מר מרדכי", whole_words=True) == ["מר"]
+
+def test_matches_the_leftmost_longest_reference():
+    terms = titles + departments
+    rng = random.Random(0)
+    pieces = terms + [" ", ",", "_", "x", "1", "ה", "ש", "ר"]
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 6)))
+        for whole_words in (False, True):
+            assert title_matcher.find(text, whole_words) == leftmost_longest(terms, text, whole_words)
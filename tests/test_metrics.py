@@ -0,0 +1,60 @@
+import json
+
+import exper
+import print_top_5_common_speakers as top
+from metrics import RunMetrics
+from name_cache import NormalizationCache
+from parallel_scan import map_chunks
+
+def write_corpus(path, lines):
+    path.write_text("".join(line + "\n" for line in lines[:-1]) + lines[-1], encoding="utf-8")
+
+def count_lines(lines):
+    return sum(1 for _ in lines)
+
+def test_stage_lines_come_from_the_scan(tmp_path):
+    path = tmp_path / "result.jsonl"
+    write_corpus(path, [json.dumps({"speaker_name": str(number)}) for number in range(1000)])
+
+    metrics = RunMetrics("test", enabled=True)
+    metrics.lap("scan")
+    chunks = map_chunks(count_lines, str(path), 3, on_lines=metrics.stage_lines)
+    metrics.finish()
+    assert sum(result for line_offset, result in chunks) == 1000
+    assert metrics.report()["stages"][0]["lines"] == 1000
+
+def test_forbidden_names_counts_json_errors(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "result.jsonl"
+    write_corpus(path, [
+        json.dumps({"speaker_name": 'היו"ר משה כהן'}, ensure_ascii=False),
+        "{not json",
+        json.dumps({"speaker_name": "דנה לוי"}, ensure_ascii=False),
+        '{"speaker_name": ',
+    ])
+    monkeypatch.setattr(exper, "file_path", str(path))
+    # main() enables the module's metrics and wraps the shared matcher; undo both afterwards
+    monkeypatch.setattr(exper, "metrics", RunMetrics("forbidden"))
+    monkeypatch.setattr(exper.title_matcher, "findall", exper.title_matcher.findall)
+    exper.main(["--metrics-json", str(tmp_path / "metrics.json")])
+
+    report = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert report["counters"]["json_errors"] == 2
+    assert report["stages"][0]["lines"] == 4
+    assert 'היו"ר משה כהן: Forbidden because it contains היו"ר' in capsys.readouterr().out
+
+def test_top_speakers_second_pass_lines_and_errors(tmp_path, monkeypatch):
+    path = tmp_path / "result.jsonl"
+    speakers = ["משה כהן"] * 3 + ["דנה לוי"] * 2 + ["רון בר"]
+    write_corpus(path, [
+        json.dumps({"speaker_name": speaker, "sentence_text": "משפט"}, ensure_ascii=False) for speaker in speakers
+    ] + ["{not json"])
+    monkeypatch.setattr(top, "file_path", str(path))
+    monkeypatch.setattr(top, "metrics", RunMetrics("top_speakers"))
+    monkeypatch.setattr(top, "cached_normalize_full_name", NormalizationCache(top.normalize_full_name, "test"))
+    top.main(["--metrics-json", str(tmp_path / "metrics.json")])
+
+    report = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    lines = {stage["stage"]: stage.get("lines") for stage in report["stages"]}
+    assert lines["first_pass"] == lines["second_pass"] == 7
+    # The malformed line is reported by both passes
+    assert report["counters"]["json_errors"] == 2
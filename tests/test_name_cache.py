@@ -0,0 +1,44 @@
+import gzip
+import json
+
+import pytest
+
+import name_cache
+import print_top_5_common_speakers as top
+from name_cache import NormalizationCache, rules_fingerprint
+
+def test_saved_table_is_reused_with_the_same_rules(tmp_path):
+    path = str(tmp_path / "result.jsonl.names.json")
+    cache = NormalizationCache(str.upper, rules_fingerprint(["a"], ["b"]))
+    cache("x")
+    cache.save(path)
+
+    reloaded = NormalizationCache(str.upper, rules_fingerprint(["a"], ["b"]))
+    assert reloaded.load(path)
+    assert dict(reloaded.table) == {"x": "X"}
+
+def test_normalizer_version_invalidates_saved_tables(tmp_path, monkeypatch):
+    path = str(tmp_path / "result.jsonl.names.json")
+    cache = NormalizationCache(str.upper, rules_fingerprint(["a"], ["b"]))
+    cache("x")
+    cache.save(path)
+
+    monkeypatch.setattr(name_cache, "NORMALIZER_VERSION", name_cache.NORMALIZER_VERSION + 1)
+    rebuilt = NormalizationCache(str.upper, rules_fingerprint(["a"], ["b"]))
+    assert not rebuilt.load(path)
+    assert not rebuilt.table
+
+@pytest.mark.parametrize("suffix, workers", [("", 1), ("", 2), (".gz", 2)])
+def test_first_pass_counts_every_lookup_once(tmp_path, monkeypatch, suffix, workers):
+    names = [f"חבר הכנסת {number % 7}" for number in range(400)]
+    text = "".join(json.dumps({"speaker_name": name}, ensure_ascii=False) + "\n" for name in names)
+    path = tmp_path / f"result.jsonl{suffix}"
+    with (gzip.open if suffix else open)(path, "wb") as file:
+        file.write(text.encode("utf-8"))
+    monkeypatch.setattr(top, "cached_normalize_full_name", NormalizationCache(top.normalize_full_name, "test"))
+
+    counts, errors = top.run_first_pass(str(path), workers)
+    stats = top.cached_normalize_full_name.stats()
+    assert sum(counts.values()) == 400
+    assert stats["hits"] + stats["misses"] == 400
+    assert stats["size"] == 7
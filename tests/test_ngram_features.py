@@ -0,0 +1,67 @@
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+from ngram_features import FeatureBuilder, FeatureStore, term_counts, tokenize
+
+WORDS = ["שלום", "חברי", "הכנסת", "היום", "נדון", "בחוק", "תודה", "רבה"]
+
+def build(store_dir, sentences, max_vocab, min_count=1):
+    builder = FeatureBuilder(str(store_dir), max_vocab)
+    for line_number, (speaker, text) in enumerate(sentences, start=1):
+        builder.add(line_number, speaker, text)
+    return builder.finish(min_count, lines=len(sentences))
+
+def sentences(seed, count=400):
+    rng = random.Random(seed)
+    speakers = ["משה", "דנה", "רון", "יעל", "אבי", "נועה"]
+    result = [(rng.choice(speakers), " ".join(rng.choices(WORDS, k=rng.randint(1, 6)))) for _ in range(count)]
+    # A speaker whose only sentence is a term seen once, so its row of totals is empty
+    result.insert(count // 2, ("שקט", "יחידאי"))
+    return result
+
+@pytest.mark.parametrize("seed", range(3))
+def test_spilled_totals_match_the_rows(tmp_path, seed):
+    corpus = sentences(seed)
+    # Every term fits under the cap, but the (speaker, term) pairs spill many times
+    meta = build(tmp_path / "capped", corpus, max_vocab=80, min_count=2)
+    assert meta["pruning"]["prunes"] == 0
+    build(tmp_path / "uncapped", corpus, max_vocab=1_000_000, min_count=2)
+
+    expected = defaultdict(Counter)
+    for speaker, text in corpus:
+        for term, count in term_counts(tokenize(text)).items():
+            expected[speaker][term] += count
+    with FeatureStore(str(tmp_path / "capped")) as capped, FeatureStore(str(tmp_path / "uncapped")) as uncapped:
+        assert capped.terms == uncapped.terms
+        for speaker in capped.speakers:
+            totals = capped.speaker_totals(speaker)
+            assert totals == uncapped.speaker_totals(speaker)
+            assert {capped.terms[term_id]: count for term_id, count in totals} == {
+                term: count for term, count in expected[speaker].items() if capped.term_id(term) is not None
+            }
+        assert capped.speaker_totals("שקט") == []
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pruned_vocabulary_keeps_rows_counts_and_totals_in_step(tmp_path, seed):
+    corpus = sentences(seed)
+    # The unigrams and bigrams of WORDS are far more than 20 terms, so the vocabulary is
+    # pruned many times and the totals spill as well
+    meta = build(tmp_path / "pruned", corpus, max_vocab=20)
+    assert meta["pruning"]["prunes"] > 0
+    assert meta["pruning"]["occurrences"] > 0
+
+    with FeatureStore(str(tmp_path / "pruned")) as store:
+        assert 0 < len(store.terms) <= 20
+        column_sums = Counter()
+        speaker_sums = defaultdict(Counter)
+        for row in range(store.rows):
+            speaker = store.speakers[store.speaker_codes[row]]
+            for term_id, count in store.row(row):
+                column_sums[term_id] += count
+                speaker_sums[speaker][term_id] += count
+        # A term's count covers exactly the occurrences left in the rows
+        assert dict(column_sums) == {term_id: count for term_id, count in enumerate(store.term_counts)}
+        for speaker in store.speakers:
+            assert dict(store.speaker_totals(speaker)) == dict(speaker_sums[speaker])
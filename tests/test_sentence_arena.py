@@ -0,0 +1,81 @@
+import json
+import random
+
+import pytest
+
+import print_top_5_common_speakers as top
+from corpus_store import build_store
+from sentence_arena import SentenceArena
+
+def test_reads_back_like_a_list():
+    sentences = ["שלום", "", "aאb", "סוף"]
+    arena = SentenceArena(sentences)
+    assert len(arena) == 4
+    assert list(arena) == sentences
+    assert arena[2] == sentences[2]
+    assert list(arena[1:3]) == sentences[1:3]
+
+    arena.extend(arena)
+    assert list(arena) == sentences * 2
+
+def test_shuffle_draws_like_a_list():
+    sentences = [str(number) for number in range(100)]
+    arena = SentenceArena(sentences)
+    arena.shuffle(random.Random(7))
+    random.Random(7).shuffle(sentences)
+    assert list(arena) == sentences
+
+def test_non_string_sentences_keep_their_json_value():
+    values = ["a", None, 3, 2.5, True, ["x"], {"y": "ש"}, "", "None"]
+    arena = SentenceArena(values)
+    assert list(arena) == values
+    assert [arena[index] for index in range(len(values))] == values
+    assert list(arena[1:3]) == [None, 3]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_second_pass_keeps_null_sentences(tmp_path, workers):
+    path = tmp_path / "result.jsonl"
+    records = [
+        {"speaker_name": "משה כהן", "sentence_text": "ראשון"},
+        {"speaker_name": "משה כהן", "sentence_text": None},
+        {"speaker_name": "דנה לוי", "sentence_text": 5},
+        {"speaker_name": "רון בר", "sentence_text": None},
+    ]
+    path.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records), encoding="utf-8")
+
+    top_2_sentences, other_sentences = top.run_second_pass(str(path), ["משה כהן", "דנה לוי"], workers)
+    assert list(top_2_sentences["משה כהן"]) == ["ראשון", None]
+    assert list(top_2_sentences["דנה לוי"]) == [5]
+    assert list(other_sentences) == [None]
+
+@pytest.mark.parametrize("mode", [[], ["--single-pass"], ["--line-index"], ["--store"]])
+def test_every_mode_writes_the_same_sentence_values(tmp_path, monkeypatch, mode):
+    path = tmp_path / "result.jsonl"
+    records = [
+        {"speaker_name": "משה כהן", "sentence_text": "ראשון"},
+        {"speaker_name": "משה כהן", "sentence_text": None},
+        {"speaker_name": "משה כהן", "sentence_text": "None"},
+        {"speaker_name": "דנה לוי", "sentence_text": 5},
+        {"speaker_name": "דנה לוי", "sentence_text": "שני"},
+        {"speaker_name": "דנה לוי", "sentence_text": ""},
+        {"speaker_name": "רון בר", "sentence_text": None},
+        {"speaker_name": "רון בר", "sentence_text": "שלישי"},
+        {"speaker_name": "טל גל", "sentence_text": [1]},
+    ]
+    path.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records), encoding="utf-8")
+    monkeypatch.setattr(top, "file_path", str(path))
+    if mode == ["--line-index"]:
+        mode = mode + [str(tmp_path / "result.jsonl.idx")]
+    elif mode == ["--store"]:
+        build_store(str(path), str(tmp_path / "store"))
+        mode = mode + [str(tmp_path / "store")]
+
+    output_dir = tmp_path / "balanced"
+    top.main(mode + ["--output-dir", str(output_dir), "--seed", "1"])
+    written = [
+        json.loads(line)["sentence_text"]
+        for shard in sorted(output_dir.glob("*.jsonl")) for line in shard.read_text(encoding="utf-8").splitlines()
+    ]
+    # Every group holds 3 sentences, so nothing is downsampled away
+    expected = [record["sentence_text"] for record in records]
+    assert sorted(map(json.dumps, written)) == sorted(map(json.dumps, expected))
@@ -0,0 +1,33 @@
+from collections import Counter
+
+import pytest
+
+import print_top_5_common_speakers as top
+from benchmarks.generate_corpus import generate_corpus
+from heavy_hitters import top_k
+from parallel_scan import read_numbered_lines
+
+@pytest.mark.parametrize("seed", range(4))
+def test_generated_corpora_do_not_fall_back(tmp_path, seed):
+    path = str(tmp_path / "result.jsonl")
+    generate_corpus(path, 20_000, seed)
+
+    # A small capacity makes the pool evict early, as on a full-size corpus
+    counter, reservoir_state, errors = top.single_pass_collect(read_numbered_lines(path), min_capacity=500)
+    two_pass_counter, two_pass_errors = top.run_first_pass(path)
+    assert dict(counter) == dict(two_pass_counter)
+    assert errors == two_pass_errors
+
+    top_2_speakers = [speaker for speaker, count in top_k(counter, 2)]
+    sample = top.reservoir_sample(reservoir_state, top_2_speakers)
+    assert sample is not None
+    top_2_sentences, other_sentences, original_sizes = sample
+
+    # The second speaker keeps every sentence, the others are sampled down to its size
+    collected, collected_others, collect_errors = top.collect_sentences(read_numbered_lines(path), top_2_speakers)
+    second = top_2_speakers[1]
+    assert Counter(top_2_sentences[second]) == Counter(collected[second])
+    target = len(collected[second])
+    assert len(top_2_sentences[top_2_speakers[0]]) == min(target, len(collected[top_2_speakers[0]]))
+    assert len(other_sentences) == min(target, len(collected_others))
+    assert original_sizes[None] == len(collected_others)